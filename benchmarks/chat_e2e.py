@@ -0,0 +1,259 @@
+"""End-to-end benchmark of the auth and chat API, fully offline.
+
+Serves the real FastAPI app with uvicorn. Every ChatOpenAI in it is replaced
+by a deterministic fake model with configurable latency, and BECKN_BASE_URL
+points at a local Beckn stand-in serving a synthetic catalog. Concurrent
+virtual users register, log in and load their profile. Each then runs
+scripted conversations (greet -> search -> select -> confirm). A chat step
+only passes when its reply also says what the step should: search lists
+items, select asks for confirmation, confirm gives an order id. The report
+gives p50/p95/p99 latency per step, errors and overall throughput.
+
+MongoDB is an in-process in-memory stand-in as well, so nothing outside the
+process is needed and the run can gate CI. Pass --mongodb to use the server
+at MONGODB_URL instead, with a throwaway database dropped afterwards.
+
+    PYTHONPATH=./src python benchmarks/chat_e2e.py --users 20 --conversations 3 --llm-latency 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from e2e_fakes import beckn_stub_app, install_fake_chat_models, install_in_memory_mongodb, serve_in_thread
+
+CONVERSATION = [
+    ("greet", "Hi, what can you do?"),
+    ("search", "I want to buy a solar battery"),
+    ("select", "select 2"),
+    ("confirm", "yes"),
+]
+
+# What the reply of each scripted step has to contain, a 2xx answer without it is still a failure
+EXPECTED_REPLIES = {
+    "greet": re.compile(r"\S"),
+    "search": re.compile(r"^1\. ", re.M),
+    "select": re.compile(r"^Selected\b.*\bconfirm\b", re.S),
+    "confirm": re.compile(r"\bOrder ID: \S+"),
+}
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.timings: dict[str, list] = defaultdict(list)
+        self.errors: dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, step: str, seconds: float, status: int, expected: bool = True) -> None:
+        self.timings[step].append(seconds)
+        if not 200 <= status < 300:
+            self.errors[step][status] += 1
+        elif not expected:
+            self.errors[step]["unexpected_reply"] += 1
+
+    def requests(self) -> int:
+        return sum(len(timings) for step, timings in self.timings.items() if not step.endswith(":first_token"))
+
+    def error_count(self) -> int:
+        return sum(sum(errors.values()) for errors in self.errors.values())
+
+    def summary(self) -> dict:
+        return {
+            step: {
+                "count": len(timings),
+                "errors": dict(self.errors.get(step, {})),
+                "p50_ms": percentile(timings, 50) * 1000,
+                "p95_ms": percentile(timings, 95) * 1000,
+                "p99_ms": percentile(timings, 99) * 1000,
+                "mean_ms": sum(timings) / len(timings) * 1000,
+            }
+            for step, timings in self.timings.items()
+        }
+
+
+def reply_text(body: dict) -> str:
+    """Answer text of a chat response body or of the stream's done event"""
+    message = body.get("message")
+    return str(message.get("output", "")) if isinstance(message, dict) else str(message or "")
+
+
+def expected_reply(step: str, body: dict) -> bool:
+    return bool(EXPECTED_REPLIES[step].search(reply_text(body)))
+
+
+async def timed(recorder: Recorder, step: str, request, check=None):
+    started_at = time.perf_counter()
+    try:
+        response = await request
+    except Exception:
+        recorder.record(step, time.perf_counter() - started_at, 0)
+        return None
+    seconds = time.perf_counter() - started_at
+    try:
+        expected = check is None or not response.is_success or check(response)
+    except ValueError:
+        # Not the JSON body a chat reply has
+        expected = False
+    recorder.record(step, seconds, response.status_code, expected)
+    return response
+
+
+async def stream_chat(client, recorder: Recorder, step: str, message: str, headers: dict) -> None:
+    """Time the SSE chat endpoint to its first token and to the done event"""
+    started_at = time.perf_counter()
+    status = 0
+    done = None
+    try:
+        async with client.stream("POST", "/api/ai/chat/stream", json={"message": message}, headers=headers) as response:
+            status = response.status_code
+            first_token = False
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                if line == "event: token" and not first_token:
+                    first_token = True
+                    recorder.record(f"chat:{step}:first_token", time.perf_counter() - started_at, status)
+                elif line == "event: error":
+                    status = 500
+                elif line.startswith("data: ") and event == "done":
+                    done = json.loads(line[len("data: "):])
+    finally:
+        recorder.record(f"chat:{step}", time.perf_counter() - started_at, status, done is not None and expected_reply(step, done))
+
+
+async def virtual_user(client, recorder: Recorder, run_id: str, index: int, args) -> None:
+    credentials = {"meter_id": f"bench-{run_id}-{index}", "password": "benchmark-password"}
+    await timed(recorder, "auth:register", client.post("/api/auth/register", json={**credentials, "email": f"bench-{run_id}-{index}@example.com"}))
+    login = await timed(recorder, "auth:login", client.post("/api/auth/login", json=credentials))
+    if login is None or login.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {login.json()['data']['access_token']}"}
+    await timed(recorder, "auth:me", client.get("/api/auth/me", headers=headers))
+
+    for conversation in range(args.conversations):
+        session = await timed(recorder, "chat:new_session", client.post("/api/ai/sessions", headers=headers))
+        if session is None or session.status_code != 200:
+            continue
+        session_headers = {**headers, "X-Session-Id": session.headers["X-Session-Id"]}
+        for step, message in CONVERSATION:
+            if step == "search" and args.distinct_queries:
+                # A query nobody asked before misses the search cache and the local catalog index
+                message = f"{message} model {run_id}-{index}-{conversation}"
+            if args.stream:
+                await stream_chat(client, recorder, step, message, session_headers)
+            else:
+                await timed(recorder, f"chat:{step}", client.post("/api/ai/chat", json={"message": message}, headers=session_headers),
+                            lambda response, step=step: expected_reply(step, response.json()))
+
+
+async def run_load(base_url: str, args) -> tuple:
+    import httpx
+
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if args.warmup:
+            await virtual_user(client, Recorder(), f"{run_id}w", 0, argparse.Namespace(**{**vars(args), "conversations": 1}))
+        recorder = Recorder()
+        started_at = time.perf_counter()
+        await asyncio.gather(*(virtual_user(client, recorder, run_id, index, args) for index in range(args.users)))
+        elapsed = time.perf_counter() - started_at
+    return recorder, elapsed
+
+
+def report(recorder: Recorder, elapsed: float, args) -> dict:
+    summary = recorder.summary()
+    print(f"{args.users} users x {args.conversations} conversations, LLM latency {args.llm_latency}s, "
+          f"Beckn latency {args.beckn_latency}s, {'streaming' if args.stream else 'non-streaming'}\n")
+    print(f"{'step':<28}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for step, stats in summary.items():
+        errors = sum(stats["errors"].values())
+        print(f"{step:<28}{stats['count']:>7}{errors:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['mean_ms']:>10.1f}")
+    requests = recorder.requests()
+    conversations = args.users * args.conversations
+    totals = {
+        "elapsed_s": elapsed,
+        "requests": requests,
+        "errors": recorder.error_count(),
+        "requests_per_s": requests / elapsed if elapsed else 0.0,
+        "conversations_per_s": conversations / elapsed if elapsed else 0.0,
+    }
+    print(f"\n{requests} requests ({totals['errors']} failed) in {elapsed:.2f}s: "
+          f"{totals['requests_per_s']:.1f} req/s, {totals['conversations_per_s']:.2f} conversations/s")
+    return {"config": vars(args), "steps": summary, "totals": totals}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--conversations", type=int, default=3, help="scripted conversations per user")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake model call")
+    parser.add_argument("--beckn-latency", type=float, default=0.05, help="seconds per Beckn stub request")
+    parser.add_argument("--providers", type=int, default=20, help="providers in the stub catalog")
+    parser.add_argument("--items", type=int, default=10, help="items per provider in the stub catalog")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream and also report time to first token")
+    parser.add_argument("--distinct-queries", action="store_true", help="give every search a unique query so it goes to the Beckn stub")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="skip the unrecorded warm-up conversation")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--beckn-port", type=int, default=8901)
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout in seconds")
+    parser.add_argument("--mongodb", action="store_true", help="use the MongoDB server at MONGODB_URL instead of the in-memory stand-in")
+    parser.add_argument("--database", default=f"beckn_deg_bot_bench_{os.getpid()}", help="MongoDB database to use, dropped afterwards")
+    parser.add_argument("--keep-db", action="store_true", help="keep the database on the --mongodb server")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="exit non-zero above this share of failed requests")
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time
+    os.environ["BECKN_BASE_URL"] = f"http://127.0.0.1:{args.beckn_port}"
+    os.environ["BECKN_MODE"] = "sync"
+    os.environ["DATABASE_NAME"] = args.database
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-not-used")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.mongodb:
+        install_in_memory_mongodb()
+    install_fake_chat_models(args.llm_latency)
+    # Imports the app's tool module, so only once the fakes and the environment are in place
+    from search_parsing import synthetic_catalog
+
+    beckn_server, beckn_thread = serve_in_thread(beckn_stub_app(synthetic_catalog(args.providers, args.items), args.beckn_latency), args.beckn_port)
+    from app import app
+
+    server, thread = serve_in_thread(app, args.port)
+    try:
+        recorder, elapsed = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args))
+    finally:
+        for running, running_thread in ((server, thread), (beckn_server, beckn_thread)):
+            running.should_exit = True
+            running_thread.join(timeout=30)
+        if not args.keep_db:
+            from config.database import db_manager
+
+            db_manager.get_database().client.drop_database(args.database)
+            db_manager.close_connection()
+
+    result = report(recorder, elapsed, args)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    requests = result["totals"]["requests"]
+    if requests and result["totals"]["errors"] / requests > args.max_error_rate:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""Deterministic stand-ins for OpenAI, the Beckn BAP and MongoDB used by the end-to-end benchmark.
+
+`install_fake_chat_models` must run before the app is imported: it swaps the
+ChatOpenAI class the app modules import for FakeChatModel.
+`install_in_memory_mongodb` must run before it too, the user service
+connects at import time.
+"""
+
+import asyncio
+import copy
+import json
+import operator
+import re
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, ClassVar, Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+from fastapi import FastAPI, Request
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+_BECKN_INTENT = re.compile(r"\b(buy|search|find|looking for|battery|solar|panel|scheme|program|dfp|select|confirm|order|yes)\b", re.I)
+_SELECT = re.compile(r"\b(?:select|choose|pick)\D*(\d+)", re.I)
+_CONFIRM = re.compile(r"\b(yes|confirm|place the order)\b", re.I)
+_USER_MESSAGE = re.compile(r"User's message:\s*(.*?)\s*(?:AI Response:|$)", re.S)
+_SESSION_ID = re.compile(r"session_id:\s*(\S+)")
+_DOMAIN = re.compile(r"domain:\s*(deg:\w+)")
+
+
+def _user_message(messages: List[BaseMessage]) -> str:
+    for message in reversed(messages):
+        if message.type == "human":
+            text = str(message.content)
+            match = _USER_MESSAGE.search(text)
+            return match.group(1) if match else text
+    return ""
+
+
+def _usage(messages: List[BaseMessage], reply: AIMessage) -> dict:
+    # Roughly four characters per token, like the real tokenizer on English text
+    prompt = sum(len(str(message.content)) for message in messages) // 4
+    completion = max(1, (len(str(reply.content)) + len(json.dumps(reply.tool_calls))) // 4)
+    return {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
+
+
+class FakeChatModel(BaseChatModel):
+    """Rule-based chat model that answers the router, the retail agent and the plain chains.
+
+    Every call waits `latency` seconds (streams wait it before the first
+    chunk) so the benchmark keeps the shape of real model round trips.
+    """
+
+    model_name: str = "fake"
+    latency: float = 0.0
+    default_latency: ClassVar[float] = 0.0
+
+    def __init__(self, model: str = "fake", **kwargs: Any):
+        fields = {name: kwargs[name] for name in ("name", "tags", "metadata", "cache") if name in kwargs}
+        super().__init__(model_name=model, latency=FakeChatModel.default_latency, **fields)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: list, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _reply(self, messages: List[BaseMessage], tools: Optional[list]) -> AIMessage:
+        text = _user_message(messages)
+        names = [tool["function"]["name"] for tool in tools or []]
+        if "RouteDecision" in names:
+            beckn = bool(_BECKN_INTENT.search(text))
+            args = {"category": "BECKN_TRANSACTION" if beckn else "GENERAL", "domain": "deg:retail" if beckn else None}
+            return AIMessage(content="", tool_calls=[{"name": "RouteDecision", "args": args, "id": "route"}])
+        if "beckn_search_api" in names:
+            # The retail prompt renders the agent scratchpad (the tool calls and results of this turn)
+            # as one assistant message right before the user's; before the first tool call it is "[]"
+            scratchpad = str(messages[-2].content) if len(messages) > 1 and messages[-1].type == "human" else "[]"
+            if scratchpad != "[]":
+                return AIMessage(content="Done. Can I help you with anything else?")
+            system = "\n".join(str(message.content) for message in messages if message.type == "system")
+            session = _SESSION_ID.search(system)
+            domain = _DOMAIN.search(system)
+            args = {"session_id": session.group(1) if session else "default-session"}
+            select, confirm = _SELECT.search(text), _CONFIRM.search(text)
+            if select:
+                call = {"name": "beckn_select_api", "args": {**args, "item_number": int(select.group(1))}}
+            elif confirm:
+                call = {"name": "beckn_confirm_api", "args": args}
+            else:
+                call = {"name": "beckn_search_api", "args": {**args, "item_name": text, "domain": domain.group(1) if domain else "deg:retail"}}
+            return AIMessage(content="", tool_calls=[{**call, "id": f"call-{len(messages)}"}])
+        if "Current summary:" in "\n".join(str(message.content) for message in messages):
+            return AIMessage(content=f"The user has been chatting about: {text[:200]}")
+        return AIMessage(content=f"Hello! I am Luma, an AI agent for Beckn energy transactions. You said: {text[:200]}")
+
+    def _result(self, messages: List[BaseMessage], tools: Optional[list]) -> ChatResult:
+        reply = self._reply(messages, tools)
+        reply.usage_metadata = _usage(messages, reply)
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages, kwargs.get("tools"))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages, kwargs.get("tools"))
+
+    def _chunks(self, messages: List[BaseMessage], tools: Optional[list]) -> Iterator[ChatGenerationChunk]:
+        reply = self._reply(messages, tools)
+        usage = _usage(messages, reply)
+        if reply.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0} for call in reply.tool_calls],
+                usage_metadata=usage,
+            ))
+            return
+        words = re.split(r"(\s+)", str(reply.content))
+        for index, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word, usage_metadata=usage if index == len(words) - 1 else None))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for chunk in self._chunks(messages, kwargs.get("tools")):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages, kwargs.get("tools")):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+
+def install_fake_chat_models(latency: float) -> None:
+    """Make every ChatOpenAI the app creates a FakeChatModel waiting `latency` seconds per call"""
+    import langchain_openai
+
+    FakeChatModel.default_latency = latency
+    langchain_openai.ChatOpenAI = FakeChatModel
+
+
+def beckn_stub_app(catalog: dict, latency: float = 0.0) -> FastAPI:
+    """Local BAP client answering search with `catalog` and echoing select and confirm orders"""
+    stub = FastAPI()
+    counter = {"orders": 0}
+
+    @stub.post("/search")
+    async def search(request: Request):
+        await asyncio.sleep(latency)
+        return catalog
+
+    @stub.post("/select")
+    async def select(request: Request):
+        await asyncio.sleep(latency)
+        body = await request.json()
+        order = body["message"]["order"]
+        return {"responses": [{"context": body["context"], "message": {"order": {
+            **order,
+            "fulfillments": [{"id": "fulfillment-1", "type": "Delivery"}],
+            "quote": {"price": {"value": "1000", "currency": "INR"}},
+        }}}]}
+
+    @stub.post("/confirm")
+    async def confirm(request: Request):
+        await asyncio.sleep(latency)
+        body = await request.json()
+        counter["orders"] += 1
+        return {"responses": [{"context": body["context"], "message": {"order": {"id": f"order-{counter['orders']}", **body["message"]["order"]}}}]}
+
+    @stub.post("/{action}")
+    async def other(action: str, request: Request):
+        await asyncio.sleep(latency)
+        return {"message": {"ack": {"status": "ACK"}}}
+
+    return stub
+
+
+def serve_in_thread(app: FastAPI, port: int):
+    """Run an ASGI app with uvicorn on a daemon thread and wait until it accepts requests"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, name=f"uvicorn-{port}", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError(f"Server on port {port} did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+# In-process MongoDB: just the operations the app issues, enough to run the benchmark without a server.
+# All clients share one store so the sync and async clients see the same documents.
+_DATABASES: dict[str, dict[str, "_CollectionState"]] = {}
+_LOCK = threading.RLock()
+_COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+class _CollectionState:
+    def __init__(self):
+        self.documents: dict[Any, dict] = {}
+        self.unique_fields: set[str] = set()
+
+
+def _satisfies(value: Any, condition: dict) -> bool:
+    for op, argument in condition.items():
+        if op == "$not":
+            if _satisfies(value, argument):
+                return False
+        elif op == "$ne":
+            if value == argument:
+                return False
+        elif op == "$in":
+            if value not in argument:
+                return False
+        elif value is None or not _COMPARISONS[op](value, argument):
+            return False
+    return True
+
+
+def _is_condition(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(key.startswith("$") for key in value)
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = document.get(field)
+        if _is_condition(condition):
+            if not _satisfies(value, condition):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return copy.deepcopy(document)
+    included = [field for field, keep in projection.items() if keep and field != "_id"]
+    if included:
+        result = {field: document[field] for field in included if field in document}
+        if projection.get("_id", 1):
+            result["_id"] = document["_id"]
+    else:
+        result = {field: value for field, value in document.items() if projection.get(field, 1)}
+    return copy.deepcopy(result)
+
+
+def _apply_update(document: dict, update: dict) -> None:
+    for op, fields in update.items():
+        for field, value in copy.deepcopy(fields).items():
+            if op == "$set":
+                document[field] = value
+            elif op == "$inc":
+                document[field] = document.get(field, 0) + value
+            elif op == "$max":
+                if field not in document or value > document[field]:
+                    document[field] = value
+            elif op == "$push":
+                values = document.get(field, [])
+                if isinstance(value, dict) and "$each" in value:
+                    values = values + value["$each"]
+                    if "$slice" in value:
+                        limit = value["$slice"]
+                        values = values[limit:] if limit < 0 else values[:limit]
+                else:
+                    values = values + [value]
+                document[field] = values
+            else:
+                raise NotImplementedError(f"In-memory MongoDB does not support {op}")
+
+
+class InMemoryCollection:
+    """Synchronous collection over the shared in-memory store.
+
+    Every public method is one command to the client's event listeners, named
+    like the command pymongo would send, so per-request command counts and
+    latency metrics work as against a server.
+    """
+
+    def __init__(self, state: _CollectionState, listeners: Iterable = ()):
+        self._state = state
+        self._listeners = list(listeners)
+
+    @contextmanager
+    def _command(self, name: str) -> Iterator[None]:
+        event = SimpleNamespace(command_name=name, duration_micros=0, failure=None)
+        for listener in self._listeners:
+            listener.started(event)
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            event.duration_micros = int((time.perf_counter() - started_at) * 1e6)
+            event.failure = {"errmsg": str(e)}
+            for listener in self._listeners:
+                listener.failed(event)
+            raise
+        event.duration_micros = int((time.perf_counter() - started_at) * 1e6)
+        for listener in self._listeners:
+            listener.succeeded(event)
+
+    def _insert(self, document: dict) -> dict:
+        document.setdefault("_id", ObjectId())
+        for field in self._state.unique_fields:
+            if field in document and any(other.get(field) == document[field] for other in self._state.documents.values()):
+                raise DuplicateKeyError(f"E11000 duplicate key error: {field}")
+        if document["_id"] in self._state.documents:
+            raise DuplicateKeyError("E11000 duplicate key error: _id")
+        self._state.documents[document["_id"]] = document
+        return document
+
+    def _find(self, query: dict, sort: Optional[list] = None) -> list[dict]:
+        found = [document for document in self._state.documents.values() if _matches(document, query)]
+        for field, direction in reversed(sort or []):
+            found.sort(key=lambda document: document.get(field), reverse=direction < 0)
+        return found
+
+    def _update(self, query: dict, update: dict, upsert: bool = False, sort: Optional[list] = None) -> tuple[Optional[dict], Any]:
+        """Update the first match, or insert one on upsert; returns the document and the upserted id"""
+        found = self._find(query, sort)
+        if found:
+            _apply_update(found[0], update)
+            return found[0], None
+        if not upsert:
+            return None, None
+        document = {field: copy.deepcopy(value) for field, value in query.items() if not _is_condition(value)}
+        _apply_update(document, update)
+        document = self._insert(document)
+        return document, document["_id"]
+
+    def create_index(self, keys, unique: bool = False, **kwargs: Any) -> str:
+        fields = [keys] if isinstance(keys, str) else [field for field, _ in keys]
+        with self._command("createIndexes"), _LOCK:
+            if unique and len(fields) == 1:
+                self._state.unique_fields.add(fields[0])
+        return "_".join(fields)
+
+    def insert_one(self, document: dict) -> SimpleNamespace:
+        with self._command("insert"), _LOCK:
+            inserted = self._insert(copy.deepcopy(document))
+        document.setdefault("_id", inserted["_id"])
+        return SimpleNamespace(inserted_id=inserted["_id"], acknowledged=True)
+
+    def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None, sort: Optional[list] = None) -> Optional[dict]:
+        with self._command("find"), _LOCK:
+            found = self._find(query or {}, sort)
+            return _project(found[0], projection) if found else None
+
+    def find_one_and_update(self, query: dict, update: dict, projection: Optional[dict] = None, sort: Optional[list] = None,
+                            upsert: bool = False, return_document: bool = ReturnDocument.BEFORE) -> Optional[dict]:
+        with self._command("findAndModify"), _LOCK:
+            before = self._find(query, sort)
+            before = copy.deepcopy(before[0]) if before else None
+            after, _ = self._update(query, update, upsert, sort)
+            document = after if return_document == ReturnDocument.AFTER else before
+            return _project(document, projection) if document else None
+
+    def update_one(self, query: dict, update: dict, upsert: bool = False) -> SimpleNamespace:
+        with self._command("update"), _LOCK:
+            document, upserted_id = self._update(query, update, upsert)
+        matched = int(document is not None and upserted_id is None)
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_id=upserted_id, acknowledged=True)
+
+    def replace_one(self, query: dict, replacement: dict, upsert: bool = False) -> SimpleNamespace:
+        with self._command("update"), _LOCK:
+            found = self._find(query)
+            if found:
+                self._state.documents[found[0]["_id"]] = {**copy.deepcopy(replacement), "_id": found[0]["_id"]}
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None, acknowledged=True)
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None, acknowledged=True)
+            document = {field: value for field, value in query.items() if not _is_condition(value)}
+            document = self._insert({**document, **copy.deepcopy(replacement)})
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=document["_id"], acknowledged=True)
+
+    def bulk_write(self, requests: list, ordered: bool = True) -> SimpleNamespace:
+        matched = upserted = 0
+        # One update command for the whole batch, as pymongo sends it
+        with self._command("update"), _LOCK:
+            for request in requests:
+                if not isinstance(request, UpdateOne):
+                    raise NotImplementedError(f"In-memory MongoDB does not support {type(request).__name__}")
+                document, upserted_id = self._update(request._filter, request._doc, upsert=request._upsert)
+                matched += int(document is not None and upserted_id is None)
+                upserted += upserted_id is not None
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_count=upserted, acknowledged=True)
+
+    def delete_one(self, query: dict) -> SimpleNamespace:
+        with self._command("delete"), _LOCK:
+            found = self._find(query)
+            if found:
+                del self._state.documents[found[0]["_id"]]
+        return SimpleNamespace(deleted_count=len(found[:1]), acknowledged=True)
+
+
+class AsyncInMemoryCollection:
+    """Awaitable face of InMemoryCollection, for the code written against AsyncMongoClient"""
+
+    def __init__(self, state: _CollectionState, listeners: Iterable = ()):
+        self._collection = InMemoryCollection(state, listeners)
+
+    def __getattr__(self, name: str):
+        method = getattr(self._collection, name)
+
+        async def call(*args: Any, **kwargs: Any):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class InMemoryDatabase:
+    def __init__(self, client, name: str, collection_class):
+        self.client = client
+        self.name = name
+        self._collection_class = collection_class
+
+    def __getitem__(self, name: str):
+        with _LOCK:
+            state = _DATABASES.setdefault(self.name, {}).setdefault(name, _CollectionState())
+        return self._collection_class(state, self.client.event_listeners)
+
+    get_collection = __getitem__
+
+
+class InMemoryMongoClient:
+    """Stands in for pymongo.MongoClient; of the client options only event_listeners is used"""
+
+    collection_class = InMemoryCollection
+
+    def __init__(self, host: Optional[str] = None, event_listeners: Optional[list] = None, **options: Any):
+        self.host = host
+        self.event_listeners = list(event_listeners or [])
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        return InMemoryDatabase(self, name, self.collection_class)
+
+    get_database = __getitem__
+
+    def drop_database(self, name: str) -> None:
+        with _LOCK:
+            _DATABASES.pop(name, None)
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncInMemoryMongoClient(InMemoryMongoClient):
+    """Stands in for pymongo.AsyncMongoClient"""
+
+    collection_class = AsyncInMemoryCollection
+
+    async def drop_database(self, name: str) -> None:
+        super().drop_database(name)
+
+    async def close(self) -> None:
+        pass
+
+
+def install_in_memory_mongodb() -> None:
+    """Make the app's DatabaseManager connect to the in-process MongoDB stand-in instead of MONGODB_URL"""
+    import config.database
+
+    config.database.MongoClient = InMemoryMongoClient
+    config.database.AsyncMongoClient = AsyncInMemoryMongoClient
@@ -0,0 +1,123 @@
+"""Benchmark Beckn /search parsing and rendering on synthetic DEG catalogs.
+
+Compares the previous parse-everything + string concatenation approach with the
+top-K parser used by the search tool.
+
+    PYTHONPATH=./src python benchmarks/search_parsing.py --providers 200 --items 60
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+# The search tool module builds (unused) OpenAI clients at import time
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-not-used")
+
+from service.ai import agents_and_tools as tools
+from service.schemas.catalog import CatalogItem
+
+
+def synthetic_catalog(providers: int, items: int, bpps: int = 5, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    responses = []
+    for b in range(bpps):
+        catalog_providers = []
+        for p in range(b, providers, bpps):
+            catalog_providers.append({
+                "id": f"provider-{p}",
+                "descriptor": {"name": f"Provider {p}", "short_desc": "x" * 200},
+                "fulfillments": [{"id": f"f-{p}", "type": "Delivery"}],
+                "items": [{
+                    "id": f"item-{p}-{i}",
+                    "descriptor": {"name": f"Battery {p}-{i}", "long_desc": "y" * 400, "images": [{"url": f"https://img/{p}/{i}.png"}]},
+                    "price": {"value": str(rng.randint(100, 100000)), "currency": "INR"},
+                    "rating": str(round(rng.uniform(1, 5), 1)),
+                    "tags": [{"descriptor": {"code": "capacity"}, "list": [{"value": f"{rng.randint(1, 20)}kWh"}]}],
+                } for i in range(items)],
+            })
+        responses.append({
+            "context": {"domain": "deg:retail", "bpp_id": f"bpp-{b}", "bpp_uri": f"https://bpp-{b}"},
+            "message": {"catalog": {"providers": catalog_providers}},
+        })
+    return {"responses": responses}
+
+
+def legacy_parse_and_render(data: dict, domain: str) -> str:
+    """Previous implementation: a CatalogItem per item and += rendering of every item"""
+    items = []
+    for r in data.get("responses", []):
+        context = r.get("context", {})
+        for provider in r.get("message", {}).get("catalog", {}).get("providers", []):
+            for item in provider.get("items", []):
+                name = item.get("descriptor", {}).get("name")
+                item_id = item.get("id")
+                if name and item_id:
+                    items.append(CatalogItem(
+                        index=len(items) + 1,
+                        item_id=item_id,
+                        name=name,
+                        price=item.get("price", {}).get("value"),
+                        currency=item.get("price", {}).get("currency"),
+                        rating=str(item.get("rating", "N/A")),
+                        provider_id=provider.get("id"),
+                        provider_name=provider.get("descriptor", {}).get("name"),
+                        bpp_id=context.get("bpp_id"),
+                        bpp_uri=context.get("bpp_uri"),
+                        domain=context.get("domain", domain),
+                        fulfillment_ids=item.get("fulfillment_ids") or [f["id"] for f in provider.get("fulfillments", []) if f.get("id")],
+                    ))
+    response_text = "Here are some products I found:\n\n"
+    for item in items:
+        response_text += (
+            f"{item.index}. **{item.name}**\n"
+            f"   - Price: ₹{item.price} {item.currency}\n"
+            f"   - Rating: ⭐ {item.rating}\n"
+            f"   - Provider: {item.provider_name}\n\n"
+        )
+    return response_text
+
+
+def top_k_parse_and_render(data: dict, domain: str) -> str:
+    items = tools._parse_search_items(data, domain)
+    return "Here are some products I found:\n\n" + "".join(tools._render_item(item, False) for item in items)
+
+
+def measure(fn, data: dict, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data, "deg:retail")
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(data, "deg:retail")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", type=int, default=200)
+    parser.add_argument("--items", type=int, default=60, help="items per provider")
+    parser.add_argument("--top-k", type=int, default=tools.BECKN_SEARCH_TOP_K)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic_catalog(args.providers, args.items)
+    tools.BECKN_SEARCH_TOP_K = args.top_k
+    print(f"{args.providers * args.items} items from {args.providers} providers, top {args.top_k}, median of {args.repeat} runs\n")
+    print(f"{'variant':<20}{'time (ms)':>12}{'peak alloc (KiB)':>20}")
+
+    seconds, peak = measure(legacy_parse_and_render, data, args.repeat)
+    print(f"{'legacy':<20}{seconds * 1000:>12.1f}{peak / 1024:>20.0f}")
+    for rank_by in ("none", "price", "rating"):
+        tools.BECKN_SEARCH_RANK_BY = rank_by
+        seconds, peak = measure(top_k_parse_and_render, data, args.repeat)
+        print(f"{'top-k/' + rank_by:<20}{seconds * 1000:>12.1f}{peak / 1024:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,32 @@
-from fastapi import FastAPI
+import logging
+import time
+from fastapi import FastAPI, Request
 from dotenv import load_dotenv
 from routes.index import router as main_router
 from fastapi.middleware.cors import CORSMiddleware
-from config.database import db_manager
+from config.database import db_manager, start_operation_count
+from config.logging_config import REQUEST_ID_HEADER, configure_logging, shutdown_logging, start_log_context
+from controllers.metrics_controllers import metrics_controller
+from models.user import user_service
+from service.ai.agents_and_tools import arefresh_search
+from service.ai.chat_history import chat_history_store
+from service.ai.history_summary import history_summarizer
+from service.beckn.callbacks import start_callbacks
+from service.beckn.catalog_index import catalog_index
+from service.beckn.client import beckn_client
+from utils.metrics import registry
 
 load_dotenv()
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "Time until the response starts, by route template (streams are still running when it is recorded)",
+    ["method", "route", "status"],
+)
+
 app = FastAPI(
     title="Beckn DEG Bot",
     description="AI Agent for Beckn Digital Enablement Gateway with Authentication",
@@ -16,25 +37,71 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup_event():
     """Initialize database connection on app startup"""
+    start_callbacks()
     db_manager.connect()
-    print("Application started successfully")
+    chat_history_store.start()
+    user_service.activity_writer.start()
+    catalog_index.start(arefresh_search)
+    logger.info("Application started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connection on app shutdown"""
+    history_summarizer.stop()
+    chat_history_store.stop()
+    user_service.activity_writer.stop()
+    catalog_index.stop()
+    await beckn_client.aclose()
+    await db_manager.close_async_connection()
     db_manager.close_connection()
-    print("Application shutdown completed")
+    logger.info("Application shutdown completed")
+    shutdown_logging()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id", "X-DB-Operations", REQUEST_ID_HEADER],
 )
 
+@app.middleware("http")
+async def count_db_operations(request: Request, call_next):
+    """Expose the number of MongoDB commands a request made as X-DB-Operations"""
+    operations = start_operation_count()
+    response = await call_next(request)
+    response.headers["X-DB-Operations"] = str(operations.count)
+    return response
+
+@app.middleware("http")
+async def correlate_request(request: Request, call_next):
+    """Tag every log record of a request with its correlation id, taken from X-Request-Id when the caller sends one"""
+    request_id = start_log_context(request.headers.get(REQUEST_ID_HEADER))
+    response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Observe request latency labelled by the matched route template"""
+    started_at = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    http_request_seconds.observe(
+        time.perf_counter() - started_at,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code,
+    )
+    return response
+
 # Include AI routes
 app.include_router(prefix="/api", router = main_router)
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_controller()
+
 @app.get("/ping")
 def read_root():
     return {"message": "PONG!! Hello, World!"}
\ No newline at end of file
@@ -1,18 +1,95 @@
+import logging
 import os
-from pymongo import MongoClient
+from contextvars import ContextVar
+from typing import Optional
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.database import Database
 from dotenv import load_dotenv
 
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 # MongoDB configuration
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "beckn_deg_bot")
 
+# Connection pool, shared by the sync and async clients
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "10000"))
+
+
+class RequestOperations:
+    """MongoDB command count of one request"""
+
+    def __init__(self):
+        self.count = 0
+
+
+_request_operations: ContextVar[Optional[RequestOperations]] = ContextVar("request_operations", default=None)
+
+
+mongodb_command_seconds = registry.histogram("mongodb_command_duration_seconds", "Latency of MongoDB commands", ["command"])
+mongodb_command_errors = registry.counter("mongodb_command_errors_total", "MongoDB commands that failed", ["command"])
+
+
+class OperationCounter(monitoring.CommandListener):
+    """Counts every command sent by our clients against the current request, if there is one,
+    and records command latency"""
+
+    def started(self, event):
+        operations = _request_operations.get()
+        if operations is not None:
+            operations.count += 1
+
+    def succeeded(self, event):
+        mongodb_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        mongodb_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
+        mongodb_command_errors.inc(command=event.command_name)
+
+
+def start_operation_count() -> RequestOperations:
+    """Start counting MongoDB commands for the current request context"""
+    operations = RequestOperations()
+    _request_operations.set(operations)
+    return operations
+
+
+def operation_count() -> int:
+    """MongoDB commands sent so far by the current request"""
+    operations = _request_operations.get()
+    return operations.count if operations is not None else 0
+
+
+def _client_options() -> dict:
+    return {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGODB_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGODB_SOCKET_TIMEOUT_MS,
+        "event_listeners": [OperationCounter()],
+    }
+
+
 class DatabaseManager:
     _instance = None
     _client = None
     _database = None
+    _async_client = None
+    _async_database = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -22,9 +99,9 @@ class DatabaseManager:
     def connect(self):
         """Initialize database connection"""
         if self._client is None:
-            self._client = MongoClient(MONGODB_URL)
+            self._client = MongoClient(MONGODB_URL, **_client_options())
             self._database = self._client[DATABASE_NAME]
-            print(f"Connected to MongoDB: {DATABASE_NAME}")
+            logger.info("Connected to MongoDB: %s", DATABASE_NAME)
     
     def get_database(self) -> Database:
         """Get database instance"""
@@ -38,7 +115,23 @@ class DatabaseManager:
             self._client.close()
             self._client = None
             self._database = None
-            print("MongoDB connection closed")
+            logger.info("MongoDB connection closed")
+
+    def get_async_database(self) -> AsyncDatabase:
+        """Get the async database instance, the client is bound to the running event loop"""
+        if self._async_database is None:
+            self._async_client = AsyncMongoClient(MONGODB_URL, **_client_options())
+            self._async_database = self._async_client[DATABASE_NAME]
+            logger.info("Connected to MongoDB (async): %s", DATABASE_NAME)
+        return self._async_database
+
+    async def close_async_connection(self):
+        """Close the async database connection"""
+        if self._async_client:
+            await self._async_client.close()
+            self._async_client = None
+            self._async_database = None
+            logger.info("MongoDB async connection closed")
 
 # Global database manager instance
 db_manager = DatabaseManager()
@@ -47,6 +140,12 @@ def get_database() -> Database:
     """Get database instance for dependency injection"""
     return db_manager.get_database()
 
+def get_async_database() -> AsyncDatabase:
+    """Get async database instance for dependency injection"""
+    return db_manager.get_async_database()
+
 # Collection names
 USERS_COLLECTION = "users"
-SESSIONS_COLLECTION = "sessions" 
\ No newline at end of file
+SESSIONS_COLLECTION = "sessions" 
+CHAT_HISTORY_COLLECTION = "chat_history"
+SESSION_CATALOG_COLLECTION = "session_catalogs"
\ No newline at end of file
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+from utils.metrics import registry
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for the log pipeline, "text" for reading logs in a terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread; when it falls behind further records are dropped, not waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Messages and logged fields are cut to this many characters
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "1000"))
+# Whole Beckn payloads and chain inputs/outputs are only logged when enabled, and then only for a sample of them
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() == "true"
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+REQUEST_ID_HEADER = "X-Request-Id"
+
+_log_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class Truncated(str):
+    """Text already cut to the field limit, so formatters pass it through as is"""
+
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    if isinstance(value, Truncated):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    return Truncated(text if len(text) <= limit else f"{text[:limit]}... [{len(text) - limit} more chars]")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def bind_log_context(**fields) -> None:
+    """Attach fields (request_id, session_id, ...) to every record logged from the current context"""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+def start_log_context(request_id: Optional[str] = None) -> str:
+    """Start the log context of a request and return its correlation id"""
+    # A caller-supplied id is kept, but bounded so it cannot bloat every record
+    request_id = request_id[:64] if request_id else new_request_id()
+    _log_context.set({"request_id": request_id})
+    return request_id
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any) -> None:
+    """Log a large object at DEBUG, only when payload logging is on and the record is sampled"""
+    if LOG_PAYLOADS and logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        logger.debug(message, extra={"payload": truncate(payload)})
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, value in _log_context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the context and `extra` fields of the record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            # Already cut to the field limit by DroppingQueueHandler.prepare
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and name not in entry:
+                entry[name] = value if isinstance(value, (int, float, bool)) or value is None else truncate(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        text = super().format(record)
+        extras = {name: value for name, value in vars(record).items() if name not in _RECORD_ATTRIBUTES and name != "request_id"}
+        return text + (" " + " ".join(f"{name}={truncate(value)}" for name, value in extras.items()) if extras else "")
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without ever blocking the caller"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message here but keep the record's extra fields for the formatter
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+queue_handler: Optional[DroppingQueueHandler] = None
+
+
+@registry.collector
+def logging_metrics():
+    yield "log_records_dropped_total", "counter", "Log records dropped because the log queue was full", [
+        ({}, queue_handler.dropped if queue_handler is not None else 0)
+    ]
+
+
+def configure_logging() -> None:
+    """Route the root logger through a queue to a background thread that writes to stdout"""
+    global _listener, queue_handler
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # Per-request HTTP client chatter is only interesting when debugging it
+    for name in ("httpx", "httpcore", "openai"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+    _listener = QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
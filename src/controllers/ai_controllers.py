@@ -1,100 +1,224 @@
 import json
 import logging
-from typing import Any, cast
+from typing import Any, Optional, cast
 from unicodedata import category
 from langchain_core.runnables import RunnableBranch, RunnableLambda, RunnableMap
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import AIMessage, HumanMessage
 
 
 from dotenv import load_dotenv
 
-from service.ai.chat_history import get_chat_history, with_session_memory
-from service.ai.prompts_and_model import categorier_model, domain_categoriser_prompt_template, general_chat_model, general_prompt_template, intent_categorier_prompt_template
+from config.logging_config import log_payload
+from service.ai.chat_history import aget_chat_history, chat_history_store, get_chat_history, with_session_memory
+from service.ai.history_summary import history_summarizer
+from service.ai.llm_metrics import metrics_callback, stage_seconds
+from service.ai.prompts_and_model import categorier_model, general_chat_model, general_prompt_template, router_prompt_template
 from service.ai.agents_and_tools import retail_agent_executor
+from service.ai.fast_path import run_fast_path
+from service.ai.response_cache import general_cache_key, general_response_cache
+from service.ai.session_catalog import session_catalog_store
+from service.beckn.catalog_index import catalog_index
+from models.session import session_service
+from service.schemas.router import ALL_DOMAINS, Category, RouteDecision
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 def log_beckn(x):
-    logging.info("Input as X in BECKN_TRANSACTION", x)
+    log_payload(logger, "Input as X in BECKN_TRANSACTION", x)
     return x
 
 
+# Single structured-output call that decides both the category and the Beckn domain.
+# function_calling keeps the result in tool_calls, which round-trips through the LLM cache.
+router_chain = (router_prompt_template | categorier_model.with_structured_output(RouteDecision, method="function_calling")).with_config(run_name="router")
+
+
+async def route_message(message: str, chat_history) -> dict:
+    """Classify the message into a category and domain with one LLM round trip"""
+    decision: RouteDecision = await router_chain.ainvoke(
+        {"input":message, "chat_history":chat_history.prompt_messages()},
+        config={"callbacks":[metrics_callback]},
+    )
+    domain = decision.domain.value if decision.domain else None
+    if decision.category == Category.BECKN_TRANSACTION and domain is None:
+        domain = ALL_DOMAINS
+    logger.info("Routed message", extra={"category": decision.category.value, "domain": domain})
+    return {
+        "input": message,
+        "category": decision.category.value,
+        "domain": domain,
+    }
+
+
+def _catalog_summary(session_id: str) -> str:
+    catalog = session_catalog_store.get(session_id)
+    return catalog.summary() if catalog else "No search has been made yet."
+
+
+async def _acatalog_summary(session_id: str) -> str:
+    catalog = await session_catalog_store.aget(session_id)
+    return catalog.summary() if catalog else "No search has been made yet."
+
+
+def run_retail_agent(x, config):
+    session_id = config["configurable"]["session_id"]
+    logger.info("Running retail agent", extra={"domain": x["domain"]})
+    return retail_agent_executor.invoke({**x, "input": x["input"], "session_id": session_id, "catalog_summary": _catalog_summary(session_id)}, config=config)
 
 
+async def arun_retail_agent(x, config):
+    session_id = config["configurable"]["session_id"]
+    logger.info("Running retail agent", extra={"domain": x["domain"]})
+    return await retail_agent_executor.ainvoke({**x, "input": x["input"], "session_id": session_id, "catalog_summary": await _acatalog_summary(session_id)}, config=config)
 
 
-def domain_categoriser_chain(data):
-    return( domain_categoriser_prompt_template 
-        | categorier_model 
-        | StrOutputParser() 
-        | RunnableLambda( lambda x: 
-           {"domain":x,"input":data["input"],"category":data["category"], "chat_history":data["chat_history"]}
-            ))
+general_chain = (general_prompt_template | general_chat_model | StrOutputParser()).with_config(run_name="general_chain")
+
+
+def run_general_chain(x, config):
+    logger.info("Running general chain")
+    key = general_cache_key(x["input"], x.get("chat_history", []))
+    cached = general_response_cache.get(key)
+    if cached is not None:
+        return cached
+    output = general_chain.invoke(x, config=config)
+    general_response_cache.set(key, output)
+    return output
+
+
+async def arun_general_chain(x, config):
+    logger.info("Running general chain")
+    key = general_cache_key(x["input"], x.get("chat_history", []))
+    cached = general_response_cache.get(key)
+    if cached is not None:
+        return cached
+    output = await general_chain.ainvoke(x, config=config)
+    general_response_cache.set(key, output)
+    return output
+
 
 branches = RunnableBranch(
     (
-        lambda x: isinstance(x, dict) and "BECKN_TRANSACTION" in x["category"],
-        RunnableLambda(lambda x: domain_categoriser_chain(x))
-        | RunnableBranch(
-            (
-                lambda x: "deg:retail" in x["domain"] , # type: ignore
-                RunnableLambda(lambda x, config: print("In deg:retail-----> ",x, config["configurable"]["session_id"]) or retail_agent_executor.invoke({**x, "input": x["input"], "session_id": config["configurable"]["session_id"]}, config=config)) # type: ignore
-               
-                | RunnableLambda(lambda x: {"output":x["output"]}) # type: ignore
-            ),
-            (
-                lambda x: "deg:schemes" in x["domain"] , # type: ignore
-                RunnableLambda(lambda x, config: print("In deg:schemes-----> ",x, config["configurable"]["session_id"]) or retail_agent_executor.invoke({**x, "input": x["input"], "session_id": config["configurable"]["session_id"]}, config=config)) # type: ignore
-               
-                | RunnableLambda(lambda x: {"output":x["output"]}) # type: ignore
-            ),    
-            RunnableLambda(lambda x: {"output":x})
-            
-        )
-        
+        lambda x: isinstance(x, dict) and x["category"] == Category.BECKN_TRANSACTION,
+        RunnableLambda(run_retail_agent, afunc=arun_retail_agent) # type: ignore
+        | RunnableLambda(lambda x: {"output":x["output"]}) # type: ignore
     ),
-    RunnableLambda(lambda x: print("In General-----> ",x) or x)
-    | general_prompt_template | general_chat_model | StrOutputParser()
+    RunnableLambda(run_general_chain, afunc=arun_general_chain) # type: ignore
     
 )
 
 
 
 
-def ai_chat_controller(message: str, session_id: str = "default-session"):
-    chat_history = get_chat_history(session_id)
+async def fast_path_reply(message: str, session_id: str):
+    """Run the rule-based pre-router and record the turn in history when it answers"""
+    with stage_seconds.time(stage="fast_path"):
+        reply = await run_fast_path(message, session_id)
+    if reply is not None:
+        await get_chat_history(session_id).aadd_messages([HumanMessage(content=message), AIMessage(content=reply)])
+        history_summarizer.schedule(session_id)
+    return reply
+
+
+async def ai_chat_controller(message: str, session_id: str = "default-session"):
+    chat_history = await aget_chat_history(session_id)
     """Chat endpoint for AI service"""
-    intent_categoriser_chain = intent_categorier_prompt_template | categorier_model | StrOutputParser() | RunnableLambda(lambda x: { "category":x, "input":message})
-    intent = intent_categoriser_chain.invoke({"input":message, "chat_history":chat_history.messages})
+    reply = await fast_path_reply(message, session_id)
+    if reply is not None:
+        return {
+            "status":"success",
+            "message":{"output":reply}
+        }
+
+    route = await route_message(message, chat_history)
     
-    print("intent",intent)
     
     
     main_chain = branches
     
     
     main_chain_with_memory = with_session_memory(main_chain)
-    data = main_chain_with_memory.invoke({"input": intent["input"], "category":intent["category"]}, config={"configurable":{"session_id":session_id}})
+    data = await main_chain_with_memory.ainvoke(route, config={"configurable":{"session_id":session_id}, "callbacks":[metrics_callback]})
+    history_summarizer.schedule(session_id)
    
    
-    print("\n\ndata",data)
+    log_payload(logger, "Chat response", data)
     return {
         "status":"success",
         "message":data
     }
+
+
+def _sse(event: str, data: Any) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def ai_chat_stream_controller(message: str, session_id: str = "default-session"):
+    """Streaming chat endpoint for AI service, yields Server-Sent Events"""
+    try:
+        chat_history = await aget_chat_history(session_id)
+        reply = await fast_path_reply(message, session_id)
+        if reply is not None:
+            yield _sse("route", {"category": Category.BECKN_TRANSACTION.value, "fast_path": True})
+            yield _sse("token", {"content": reply})
+            yield _sse("done", {"status":"success", "message":{"output":reply}})
+            return
+
+        route = await route_message(message, chat_history)
+        yield _sse("route", {"category": route["category"], "domain": route["domain"]})
+
+        main_chain_with_memory = with_session_memory(branches)
+        data = None
+        streamed = False
+        async for event in main_chain_with_memory.astream_events(
+            route,
+            config={"configurable":{"session_id":session_id}, "callbacks":[metrics_callback]},
+            version="v2",
+        ):
+            kind = event["event"]
+            if kind == "on_tool_start":
+                yield _sse("tool_start", {"tool": event["name"]})
+            elif kind == "on_tool_end":
+                yield _sse("tool_end", {"tool": event["name"]})
+            elif kind == "on_custom_event" and event["name"] == "beckn_partial_results":
+                yield _sse("partial_results", event["data"])
+            elif kind == "on_chat_model_stream" and "classifier" not in event.get("tags", []):
+                token = event["data"]["chunk"].content
+                if token:
+                    streamed = True
+                    yield _sse("token", {"content": token})
+            elif kind == "on_chain_end" and not event["parent_ids"]:
+                data = event["data"]["output"]
+
+        history_summarizer.schedule(session_id)
+
+        # Cache hits and return_direct tools produce no model tokens, send the answer in one piece
+        if not streamed:
+            output = data["output"] if isinstance(data, dict) else data
+            if isinstance(output, str):
+                yield _sse("token", {"content": output})
+        yield _sse("done", {"status":"success", "message":data})
+    except Exception:
+        logger.exception("Chat stream error")
+        yield _sse("error", {"status":"error", "message":"Something went wrong while generating the response"})
     
     
-    
-def ai_health_check_controller(session_id: str = "default-session"):
-    """Health check endpoint for AI service"""
-    print("session_id-----> ",session_id)
-    chat_history = get_chat_history(session_id)
-    print("chat_history-----> ",chat_history)
+async def ai_health_check_controller(session_id: Optional[str] = None):
+    """Health check endpoint for AI service, with the history of a session the caller owns when one is given"""
+    messages = (await aget_chat_history(session_id)).messages if session_id else []
     return {
         "status":"healthy",
         "message":"AI service is running",
-        "data":chat_history
+        "data":messages,
+        "memory":chat_history_store.stats(),
+        "summaries":history_summarizer.stats(),
+        "catalog_index":catalog_index.stats(),
+        "sessions":session_service.stats()
     }
\ No newline at end of file
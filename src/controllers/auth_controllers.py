@@ -1,14 +1,25 @@
+import logging
 from fastapi import HTTPException, status
 from datetime import timedelta
-from models.user import UserCreate, UserLogin, UserResponse, user_service
-from utils.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from models.user import UserCreate, UserLogin, UserResponse, async_user_service, user_service
+from utils.auth import create_access_token, token_cache, PasswordHashingBusy, ACCESS_TOKEN_EXPIRE_MINUTES
 
+logger = logging.getLogger(__name__)
 
-def register_controller(user_data: UserCreate) -> dict:
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts right now, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def register_controller(user_data: UserCreate) -> dict:
     """Handle user registration"""
     try:
         # Create user
-        user = user_service.create_user(user_data)
+        user = await async_user_service.create_user(user_data)
         
         if not user:
             raise HTTPException(
@@ -34,19 +45,21 @@ def register_controller(user_data: UserCreate) -> dict:
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Registration error: {e}")
+    except PasswordHashingBusy:
+        raise _hashing_busy()
+    except Exception:
+        logger.exception("Registration error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during registration"
         )
 
 
-def login_controller(user_credentials: UserLogin) -> dict:
+async def login_controller(user_credentials: UserLogin) -> dict:
     """Handle user login"""
     try:
         # Authenticate user
-        user = user_service.authenticate_user(
+        user = await async_user_service.authenticate_user(
             user_credentials.meter_id, 
             user_credentials.password
         )
@@ -76,8 +89,10 @@ def login_controller(user_credentials: UserLogin) -> dict:
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Login error: {e}")
+    except PasswordHashingBusy:
+        raise _hashing_busy()
+    except Exception:
+        logger.exception("Login error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during login"
@@ -109,5 +124,10 @@ def auth_health_check_controller() -> dict:
     """Auth service health check"""
     return {
         "status": "healthy",
-        "message": "Auth service is running"
+        "message": "Auth service is running",
+        "cache": {
+            "tokens": token_cache.stats(),
+            "users": user_service.user_cache.stats()
+        },
+        "activity": user_service.activity_writer.stats()
     } 
\ No newline at end of file
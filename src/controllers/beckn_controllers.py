@@ -0,0 +1,17 @@
+import logging
+from service.beckn.callbacks import CALLBACK_ACTIONS, callback_registry
+
+logger = logging.getLogger(__name__)
+
+
+def beckn_nack(message: str) -> dict:
+    return {"message": {"ack": {"status": "NACK"}}, "error": {"message": message}}
+
+
+def beckn_callback_controller(action: str, payload: dict) -> dict:
+    """Handle an asynchronous on_* callback from the Beckn network"""
+    if action not in CALLBACK_ACTIONS:
+        return beckn_nack(f"Unsupported action {action}")
+    if not callback_registry.deliver(payload):
+        logger.warning("Unmatched %s callback", action, extra={"message_id": payload.get("context", {}).get("message_id")})
+    return {"message": {"ack": {"status": "ACK"}}}
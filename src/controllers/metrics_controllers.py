@@ -0,0 +1,49 @@
+from fastapi import Response
+
+from models.session import session_service
+from models.user import user_service
+from service.ai.llm_cache import classification_cache
+from service.ai.response_cache import general_response_cache
+from service.beckn.catalog_index import catalog_index
+from service.beckn.search_cache import search_cache
+from utils.auth import token_cache
+from utils.metrics import CONTENT_TYPE, registry
+
+
+def _cache_lookups() -> dict:
+    """Cache name -> (hits, misses) since the process started"""
+    lookups = {
+        name: (stats["hits"], stats["misses"])
+        for name, stats in (
+            ("auth_tokens", token_cache.stats()),
+            ("users", user_service.user_cache.stats()),
+            ("general_responses", general_response_cache.stats()),
+            ("session_owners", session_service.stats()["owners"]),
+            ("session_latest", session_service.stats()["latest"]),
+        )
+    }
+    search = search_cache.stats()
+    lookups["beckn_search"] = (search["fresh_hits"] + search["stale_hits"], search["misses"])
+    lookups["catalog_index"] = (catalog_index.hits, catalog_index.misses)
+    if classification_cache is not None:
+        lookups["llm_classification"] = (classification_cache.hits, classification_cache.misses)
+    return lookups
+
+
+@registry.collector
+def cache_metrics():
+    lookups = _cache_lookups()
+    yield "cache_hits_total", "counter", "Cache lookups that were served from the cache", [
+        ({"cache": name}, hits) for name, (hits, _) in lookups.items()
+    ]
+    yield "cache_misses_total", "counter", "Cache lookups that missed", [
+        ({"cache": name}, misses) for name, (_, misses) in lookups.items()
+    ]
+    yield "cache_hit_ratio", "gauge", "Share of cache lookups served from the cache since start", [
+        ({"cache": name}, hits / (hits + misses) if hits + misses else 0.0) for name, (hits, misses) in lookups.items()
+    ]
+
+
+def metrics_controller() -> Response:
+    """Prometheus scrape endpoint"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
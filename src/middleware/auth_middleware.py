@@ -2,7 +2,7 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from utils.auth import verify_token, extract_user_id_from_token
-from models.user import user_service, UserResponse
+from models.user import async_user_service, UserResponse
 
 # Security scheme for Bearer token
 security = HTTPBearer()
@@ -31,13 +31,13 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except Exception:
         raise credentials_exception
     
-    # Get user from database
-    user = user_service.get_user_by_id(user_id)
+    # Get user from the auth cache, falling back to the database
+    user = await async_user_service.get_cached_user_by_id(user_id)
     if user is None:
         raise credentials_exception
     
-    # Update user activity
-    user_service.update_user_activity(user_id)
+    # Record user activity, flushed to the database in the background
+    async_user_service.record_user_activity(user_id)
     
     return user
 
@@ -70,9 +70,9 @@ async def get_optional_current_user(credentials: Optional[HTTPAuthorizationCrede
         if user_id is None:
             return None
             
-        user = user_service.get_user_by_id(user_id)
+        user = await async_user_service.get_cached_user_by_id(user_id)
         if user and user.is_active:
-            user_service.update_user_activity(user_id)
+            async_user_service.record_user_activity(user_id)
             return user
             
     except Exception:
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import secrets
+from datetime import datetime, timezone
+from typing import Optional
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.database import Database
+from config.database import get_async_database, get_database, SESSIONS_COLLECTION
+from utils.cache import TTLCache
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+# A session's last_seen_at is written at most once per interval; in between it is served from memory
+SESSION_TOUCH_INTERVAL_SECONDS = float(os.getenv("SESSION_TOUCH_INTERVAL_SECONDS", "300"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+SESSION_ID_BYTES = 9
+
+
+class ChatSession(BaseModel):
+    id: str
+    user_id: str
+    created_at: datetime
+    last_seen_at: datetime
+
+
+def new_session_id() -> str:
+    """Short random URL-safe session id (12 characters)"""
+    return secrets.token_urlsafe(SESSION_ID_BYTES)
+
+
+def session_shard(session_id: str, shards: int) -> int:
+    """Stable shard number of a session, for sticky routing or partitioning sessions across workers"""
+    digest = hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+class SessionService:
+    """Chat sessions bound to a user instead of to a bearer token.
+
+    A user keeps resuming their latest session across token refreshes until
+    they start a new one; clients can also pin one with its id.
+    """
+
+    def __init__(self, database: Database = None):
+        sync_collection = (database or get_database())[SESSIONS_COLLECTION]
+        sync_collection.create_index([("user_id", 1), ("last_seen_at", -1)])
+        sync_collection.create_index("last_seen_at", expireAfterSeconds=SESSION_TTL_SECONDS)
+        # session_id -> user_id and user_id -> latest session_id, both expiring at the touch interval
+        self._owners = TTLCache(maxsize=SESSION_CACHE_MAX_ENTRIES, ttl=SESSION_TOUCH_INTERVAL_SECONDS)
+        self._latest = TTLCache(maxsize=SESSION_CACHE_MAX_ENTRIES, ttl=SESSION_TOUCH_INTERVAL_SECONDS)
+
+    @property
+    def collection(self) -> AsyncCollection:
+        return get_async_database()[SESSIONS_COLLECTION]
+
+    def _remember(self, session_id: str, user_id: str) -> None:
+        self._owners.set(session_id, user_id)
+        self._latest.set(user_id, session_id)
+
+    async def create_session(self, user_id: str) -> ChatSession:
+        """Start a new session for the user"""
+        now = datetime.now(timezone.utc)
+        session = ChatSession(id=new_session_id(), user_id=user_id, created_at=now, last_seen_at=now)
+        await self.collection.insert_one({"_id": session.id, **session.model_dump(exclude={"id"})})
+        self._remember(session.id, user_id)
+        return session
+
+    async def resolve_session(self, user_id: str, session_id: Optional[str] = None) -> str:
+        """Session id for a chat request.
+
+        A requested id is used when it still belongs to the user, otherwise a new
+        session is started; without one the user's latest session is resumed.
+        """
+        if session_id:
+            if self._owners.get(session_id) == user_id:
+                return session_id
+            query, sort = {"_id": session_id, "user_id": user_id}, None
+        else:
+            latest = self._latest.get(user_id)
+            if latest is not None:
+                return latest
+            query, sort = {"user_id": user_id}, [("last_seen_at", -1)]
+
+        doc = await self.collection.find_one_and_update(
+            query,
+            {"$set": {"last_seen_at": datetime.now(timezone.utc)}},
+            projection={"_id": 1},
+            sort=sort,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc:
+            self._remember(doc["_id"], user_id)
+            return doc["_id"]
+        return (await self.create_session(user_id)).id
+
+    async def owns_session(self, user_id: str, session_id: str) -> bool:
+        """Whether the session exists and belongs to the user"""
+        if self._owners.get(session_id) == user_id:
+            return True
+        if await self.collection.find_one({"_id": session_id, "user_id": user_id}, {"_id": 1}) is None:
+            return False
+        self._owners.set(session_id, user_id)
+        return True
+
+    def stats(self) -> dict:
+        return {"owners": self._owners.stats(), "latest": self._latest.stats()}
+
+
+# Global session service instance
+session_service = SessionService()
@@ -1,10 +1,31 @@
+import logging
+import os
+import threading
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 from pydantic import BaseModel, EmailStr, Field
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.collection import Collection
+from pymongo.asynchronous.collection import AsyncCollection
 from pymongo.database import Database
-from config.database import get_database, USERS_COLLECTION
-from utils.auth import get_password_hash, verify_password
+from config.database import get_async_database, get_database, USERS_COLLECTION
+from utils.auth import aget_password_hash, averify_and_update, get_password_hash, verify_password
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# UserResponse by id for the auth dependencies; invalidated on update/deactivation in this process,
+# other workers pick changes up after the TTL
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+USER_ACTIVITY_FLUSH_INTERVAL_SECONDS = float(os.getenv("USER_ACTIVITY_FLUSH_INTERVAL_SECONDS", "30"))
+
+# Only the fields the response models need leave the database
+USER_RESPONSE_PROJECTION = {"meter_id": 1, "email": 1, "full_name": 1, "is_active": 1, "created_at": 1}
+USER_AUTH_PROJECTION = {**USER_RESPONSE_PROJECTION, "hashed_password": 1}
 
 
 class UserCreate(BaseModel):
@@ -45,119 +66,308 @@ class UserInDB(BaseModel):
     updated_at: datetime
 
 
+class UserActivityWriter:
+    """Write-behind of user activity timestamps.
+
+    Requests only record the latest timestamp per user in memory; a background
+    thread writes them with a single unordered bulk_write per flush interval.
+    """
+
+    def __init__(self, collection: Collection, flush_interval: float = USER_ACTIVITY_FLUSH_INTERVAL_SECONDS):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self._pending: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.written = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="user-activity-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher thread and write out anything still buffered"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing user activity")
+
+    def record(self, user_id: str) -> None:
+        with self._lock:
+            self._pending[user_id] = datetime.now(timezone.utc)
+            self.recorded += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        # $max keeps the newest timestamp when several workers flush the same user
+        try:
+            self.collection.bulk_write([
+                UpdateOne({"_id": ObjectId(user_id)}, {"$max": {"updated_at": seen_at}})
+                for user_id, seen_at in pending.items()
+            ], ordered=False)
+        except Exception:
+            # Retried by the next flush; $max makes writing a timestamp twice harmless
+            with self._lock:
+                for user_id, seen_at in pending.items():
+                    self._pending[user_id] = max(seen_at, self._pending.get(user_id, seen_at))
+            raise
+        self.written += len(pending)
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "recorded": self.recorded, "written": self.written}
+
+
+def _user_filter(user_id: str) -> Optional[Dict[str, Any]]:
+    """Query for one user by id, None when the id is not a valid ObjectId"""
+    try:
+        return {"_id": ObjectId(user_id)}
+    except InvalidId:
+        return None
+
+
+def _user_update(updates: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$set": {**updates, "updated_at": datetime.now(timezone.utc)}}
+
+
+def _new_user_doc(user_data: UserCreate, hashed_password: str) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return {
+        "meter_id": user_data.meter_id,
+        "email": user_data.email,
+        "hashed_password": hashed_password,
+        "full_name": user_data.full_name,
+        "is_active": True,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def _doc_to_user_response(doc: Optional[Dict[str, Any]]) -> Optional[UserResponse]:
+    """Convert MongoDB document to UserResponse, None without a document"""
+    if not doc:
+        return None
+    return UserResponse(
+        id=str(doc["_id"]),
+        meter_id=doc["meter_id"],
+        email=doc["email"],
+        full_name=doc.get("full_name"),
+        is_active=doc.get("is_active", True),
+        created_at=doc["created_at"]
+    )
+
+
+def _doc_to_user_in_db(doc: Optional[Dict[str, Any]]) -> Optional[UserInDB]:
+    """Convert MongoDB document to UserInDB, None without a document"""
+    if not doc:
+        return None
+    return UserInDB(
+        id=str(doc["_id"]),
+        meter_id=doc["meter_id"],
+        email=doc["email"],
+        hashed_password=doc["hashed_password"],
+        full_name=doc.get("full_name"),
+        is_active=doc.get("is_active", True),
+        created_at=doc["created_at"],
+        updated_at=doc["updated_at"]
+    )
+
+
+def _inserted_user(user_doc: Dict[str, Any], inserted_id: ObjectId) -> UserResponse:
+    return _doc_to_user_response({**user_doc, "_id": inserted_id})
+
+
+def _authenticated_user(user_doc: Optional[Dict[str, Any]], verified: bool) -> Optional[UserResponse]:
+    """The user of a login attempt, None unless the password matched an active user"""
+    if not user_doc or not verified or not user_doc.get("is_active", True):
+        return None
+    return _doc_to_user_response(user_doc)
+
+
 class UserService:
     def __init__(self, database: Database = None):
         self.db = database or get_database()
         self.collection = self.db[USERS_COLLECTION]
+        self.user_cache = TTLCache(maxsize=AUTH_USER_CACHE_MAX_ENTRIES, ttl=AUTH_USER_CACHE_TTL_SECONDS)
+        self.activity_writer = UserActivityWriter(self.collection)
         
         # Create unique indexes on meter_id and email
         self.collection.create_index("meter_id", unique=True)
         self.collection.create_index("email", unique=True)
     
     def create_user(self, user_data: UserCreate) -> Optional[UserResponse]:
-        """Create a new user"""
-        # Check if user already exists by meter_id or email
-        if self.get_user_by_meter_id(user_data.meter_id) or self.get_user_by_email(user_data.email):
-            return None
-        
-        # Hash password and create user document
-        hashed_password = get_password_hash(user_data.password)
-        now = datetime.now(timezone.utc)
-        
-        user_doc = {
-            "meter_id": user_data.meter_id,
-            "email": user_data.email,
-            "hashed_password": hashed_password,
-            "full_name": user_data.full_name,
-            "is_active": True,
-            "created_at": now,
-            "updated_at": now
-        }
+        """Create a new user, None when the meter_id or email is already registered"""
+        user_doc = _new_user_doc(user_data, get_password_hash(user_data.password))
         
+        # The unique indexes reject duplicates, so no pre-check round trips are needed
         try:
             result = self.collection.insert_one(user_doc)
-            user_doc["_id"] = result.inserted_id
-            return self._doc_to_user_response(user_doc)
-        except Exception as e:
-            print(f"Error creating user: {e}")
+        except DuplicateKeyError:
             return None
+        return _inserted_user(user_doc, result.inserted_id)
     
     def get_user_by_email(self, email: str) -> Optional[UserInDB]:
         """Get user by email"""
-        user_doc = self.collection.find_one({"email": email})
-        if user_doc:
-            return self._doc_to_user_in_db(user_doc)
-        return None
+        return _doc_to_user_in_db(self.collection.find_one({"email": email}))
     
     def get_user_by_meter_id(self, meter_id: str) -> Optional[UserInDB]:
         """Get user by meter_id"""
-        user_doc = self.collection.find_one({"meter_id": meter_id})
-        if user_doc:
-            return self._doc_to_user_in_db(user_doc)
-        return None
+        return _doc_to_user_in_db(self.collection.find_one({"meter_id": meter_id}))
     
     def get_user_by_id(self, user_id: str) -> Optional[UserResponse]:
-        """Get user by ID"""
-        try:
-            user_doc = self.collection.find_one({"_id": ObjectId(user_id)})
-            if user_doc:
-                return self._doc_to_user_response(user_doc)
-        except Exception as e:
-            print(f"Error getting user by ID: {e}")
-        return None
+        """Get user by ID, None when there is no such user; database errors are raised"""
+        query = _user_filter(user_id)
+        if query is None:
+            return None
+        return _doc_to_user_response(self.collection.find_one(query, USER_RESPONSE_PROJECTION))
     
+    def get_cached_user_by_id(self, user_id: str) -> Optional[UserResponse]:
+        """Get user by ID through the auth user cache"""
+        user = self.user_cache.get(user_id)
+        if user is None:
+            user = self.get_user_by_id(user_id)
+            if user is not None:
+                self.user_cache.set(user_id, user)
+        return user
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop a user from the auth user cache after it changed"""
+        self.user_cache.pop(user_id)
+
+    def update_user(self, user_id: str, updates: Dict[str, Any]) -> Optional[UserResponse]:
+        """Update user fields and return the updated user, None when there is no such user"""
+        query = _user_filter(user_id)
+        if query is None:
+            return None
+        try:
+            user_doc = self.collection.find_one_and_update(
+                query, _user_update(updates), projection=USER_RESPONSE_PROJECTION, return_document=ReturnDocument.AFTER
+            )
+        finally:
+            self.invalidate_user(user_id)
+        return _doc_to_user_response(user_doc)
+
+    def deactivate_user(self, user_id: str) -> bool:
+        """Mark a user inactive so its tokens stop authenticating"""
+        return self.update_user(user_id, {"is_active": False}) is not None
+
     def authenticate_user(self, meter_id: str, password: str) -> Optional[UserResponse]:
         """Authenticate user with meter_id and password"""
-        user = self.get_user_by_meter_id(meter_id)
-        if not user:
-            return None
-        
-        if not verify_password(password, user.hashed_password):
-            return None
-        
-        if not user.is_active:
-            return None
-        
-        # Convert to response model
-        user_doc = self.collection.find_one({"meter_id": meter_id})
-        return self._doc_to_user_response(user_doc)
+        user_doc = self.collection.find_one({"meter_id": meter_id}, USER_AUTH_PROJECTION)
+        return _authenticated_user(user_doc, bool(user_doc) and verify_password(password, user_doc["hashed_password"]))
     
     def update_user_activity(self, user_id: str) -> bool:
         """Update user's last activity timestamp"""
-        try:
-            result = self.collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$set": {"updated_at": datetime.now(timezone.utc)}}
-            )
-            return result.modified_count > 0
-        except Exception as e:
-            print(f"Error updating user activity: {e}")
+        query = _user_filter(user_id)
+        if query is None:
             return False
+        return self.collection.update_one(query, _user_update({})).modified_count > 0
     
-    def _doc_to_user_response(self, doc: Dict[str, Any]) -> UserResponse:
-        """Convert MongoDB document to UserResponse"""
-        return UserResponse(
-            id=str(doc["_id"]),
-            meter_id=doc["meter_id"],
-            email=doc["email"],
-            full_name=doc.get("full_name"),
-            is_active=doc.get("is_active", True),
-            created_at=doc["created_at"]
-        )
-    
-    def _doc_to_user_in_db(self, doc: Dict[str, Any]) -> UserInDB:
-        """Convert MongoDB document to UserInDB"""
-        return UserInDB(
-            id=str(doc["_id"]),
-            meter_id=doc["meter_id"],
-            email=doc["email"],
-            hashed_password=doc["hashed_password"],
-            full_name=doc.get("full_name"),
-            is_active=doc.get("is_active", True),
-            created_at=doc["created_at"],
-            updated_at=doc["updated_at"]
-        )
-
-
-# Global user service instance
-user_service = UserService() 
\ No newline at end of file
+    def record_user_activity(self, user_id: str) -> None:
+        """Buffer the user's last activity timestamp, written by the activity writer"""
+        self.activity_writer.record(user_id)
+
+
+class AsyncUserService:
+    """Async counterpart of UserService for request handlers.
+
+    Shares the auth user cache and the activity writer of the sync service, and
+    the module's query, update and conversion helpers with it; indexes are
+    created by the sync service.
+    """
+
+    def __init__(self, sync_service: UserService):
+        self.sync_service = sync_service
+        self.user_cache = sync_service.user_cache
+        self.activity_writer = sync_service.activity_writer
+
+    @property
+    def collection(self) -> AsyncCollection:
+        return get_async_database()[USERS_COLLECTION]
+
+    async def create_user(self, user_data: UserCreate) -> Optional[UserResponse]:
+        """Create a new user in a single round trip, None when the meter_id or email is already registered"""
+        user_doc = _new_user_doc(user_data, await aget_password_hash(user_data.password))
+
+        try:
+            result = await self.collection.insert_one(user_doc)
+        except DuplicateKeyError:
+            return None
+        return _inserted_user(user_doc, result.inserted_id)
+
+    async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
+        """Get user by email"""
+        return _doc_to_user_in_db(await self.collection.find_one({"email": email}))
+
+    async def get_user_by_meter_id(self, meter_id: str) -> Optional[UserInDB]:
+        """Get user by meter_id"""
+        return _doc_to_user_in_db(await self.collection.find_one({"meter_id": meter_id}))
+
+    async def get_user_by_id(self, user_id: str) -> Optional[UserResponse]:
+        """Get user by ID, None when there is no such user; database errors are raised"""
+        query = _user_filter(user_id)
+        if query is None:
+            return None
+        return _doc_to_user_response(await self.collection.find_one(query, USER_RESPONSE_PROJECTION))
+
+    async def get_cached_user_by_id(self, user_id: str) -> Optional[UserResponse]:
+        """Get user by ID through the auth user cache"""
+        user = self.user_cache.get(user_id)
+        if user is None:
+            user = await self.get_user_by_id(user_id)
+            if user is not None:
+                self.user_cache.set(user_id, user)
+        return user
+
+    async def update_user(self, user_id: str, updates: Dict[str, Any]) -> Optional[UserResponse]:
+        """Update user fields and return the updated user, None when there is no such user"""
+        query = _user_filter(user_id)
+        if query is None:
+            return None
+        try:
+            user_doc = await self.collection.find_one_and_update(
+                query, _user_update(updates), projection=USER_RESPONSE_PROJECTION, return_document=ReturnDocument.AFTER
+            )
+        finally:
+            self.sync_service.invalidate_user(user_id)
+        return _doc_to_user_response(user_doc)
+
+    async def deactivate_user(self, user_id: str) -> bool:
+        """Mark a user inactive so its tokens stop authenticating"""
+        return await self.update_user(user_id, {"is_active": False}) is not None
+
+    async def authenticate_user(self, meter_id: str, password: str) -> Optional[UserResponse]:
+        """Authenticate user with meter_id and password"""
+        user_doc = await self.collection.find_one({"meter_id": meter_id}, USER_AUTH_PROJECTION)
+        if not user_doc:
+            return None
+
+        verified, new_hash = await averify_and_update(password, user_doc["hashed_password"])
+        user = _authenticated_user(user_doc, verified)
+        if user is not None and new_hash:
+            # The hash was made with a different BCRYPT_ROUNDS, upgrade it while we have the password
+            await self.collection.update_one({"_id": user_doc["_id"]}, {"$set": {"hashed_password": new_hash}})
+        return user
+
+    def record_user_activity(self, user_id: str) -> None:
+        """Buffer the user's last activity timestamp, written by the activity writer"""
+        self.activity_writer.record(user_id)
+
+
+# Global user service instances; the sync one stays for scripts and background threads
+user_service = UserService()
+async_user_service = AsyncUserService(user_service)
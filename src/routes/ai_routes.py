@@ -1,10 +1,11 @@
-import json
-
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Depends, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 import controllers.ai_controllers as ai_controllers
+from config.logging_config import bind_log_context
 from middleware.auth_middleware import get_current_active_user
+from models.session import session_service
 from models.user import UserResponse
 
 
@@ -15,26 +16,70 @@ class ChatRequest(BaseModel):
 # Create router
 router = APIRouter()
 
-@router.post("/health" )
-async def ai_health_check_route(http_request: Request):
-    data = await http_request.body()
-    data = json.loads(data)
-    print("data-----> ",data)
-    """Health check endpoint for AI service"""
-    return ai_controllers.ai_health_check_controller(data["session_id"])
+class HealthRequest(BaseModel):
+    session_id: Optional[str] = Field(default=None, description="One of the caller's sessions whose history to include")
+
+
+@router.post("/health")
+async def ai_health_check_route(
+    request: Optional[HealthRequest] = None,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Health check endpoint for AI service; history is only returned for the caller's own session"""
+    session_id = request.session_id if request else None
+    if session_id is not None and not await session_service.owns_session(current_user.id, session_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    return await ai_controllers.ai_health_check_controller(session_id)
+
+
+async def chat_session_id(http_request: Request, current_user: UserResponse) -> str:
+    """Server-side session of the user, optionally pinned with the X-Session-Id header"""
+    session_id = await session_service.resolve_session(current_user.id, http_request.headers.get("X-Session-Id"))
+    bind_log_context(session_id=session_id)
+    return session_id
+
+
+@router.post("/sessions")
+async def ai_new_session_route(
+    response: Response,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Start a new chat session for the current user"""
+    session = await session_service.create_session(current_user.id)
+    response.headers["X-Session-Id"] = session.id
+    return {
+        "status":"success",
+        "data":{"session_id":session.id}
+    }
 
 
 @router.post("/chat")
 async def ai_chat_route(
     request: ChatRequest, 
 
-    http_request: Request 
+    http_request: Request,
+    response: Response,
+    current_user: UserResponse = Depends(get_current_active_user)
 ):
     """Chat endpoint for AI service - requires authentication"""
    
-    session_id = http_request.headers['authorization'].split("Bearer")[1].strip()
-    print("session_id-----> ",session_id)
-    return ai_controllers.ai_chat_controller(request.message,session_id )
+    session_id = await chat_session_id(http_request, current_user)
+    response.headers["X-Session-Id"] = session_id
+    return await ai_controllers.ai_chat_controller(request.message,session_id )
 
 
+@router.post("/chat/stream")
+async def ai_chat_stream_route(
+    request: ChatRequest,
+
+    http_request: Request,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Streaming chat endpoint for AI service - emits Server-Sent Events"""
 
+    session_id = await chat_session_id(http_request, current_user)
+    return StreamingResponse(
+        ai_controllers.ai_chat_stream_controller(request.message, session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session_id},
+    )
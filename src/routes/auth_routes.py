@@ -20,12 +20,12 @@ async def auth_health_check():
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserCreate):
     """User registration endpoint"""
-    return register_controller(user_data)
+    return await register_controller(user_data)
 
 @router.post("/login", status_code=status.HTTP_200_OK)
 async def login(user_credentials: UserLogin):
     """User login endpoint"""
-    return login_controller(user_credentials)
+    return await login_controller(user_credentials)
 
 @router.post("/logout", status_code=status.HTTP_200_OK)
 async def logout():
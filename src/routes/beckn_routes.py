@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+from controllers.beckn_controllers import beckn_callback_controller, beckn_nack
+
+# Webhook receivers for the asynchronous Beckn callbacks (BECKN_MODE=callback)
+router = APIRouter()
+
+
+async def receive_callback(action: str, http_request: Request):
+    """Pass a callback body to the controller, answering a NACK with 400 when it is not a Beckn message"""
+    try:
+        payload = await http_request.json()
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict) or not isinstance(payload.get("context"), dict):
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=beckn_nack("Invalid callback body"))
+    return beckn_callback_controller(action, payload)
+
+@router.post("/on_search", status_code=status.HTTP_200_OK)
+async def on_search(http_request: Request):
+    return await receive_callback("on_search", http_request)
+
+@router.post("/on_select", status_code=status.HTTP_200_OK)
+async def on_select(http_request: Request):
+    return await receive_callback("on_select", http_request)
+
+@router.post("/on_init", status_code=status.HTTP_200_OK)
+async def on_init(http_request: Request):
+    return await receive_callback("on_init", http_request)
+
+@router.post("/on_confirm", status_code=status.HTTP_200_OK)
+async def on_confirm(http_request: Request):
+    return await receive_callback("on_confirm", http_request)
+
+@router.post("/on_status", status_code=status.HTTP_200_OK)
+async def on_status(http_request: Request):
+    return await receive_callback("on_status", http_request)
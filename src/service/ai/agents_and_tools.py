@@ -1,12 +1,17 @@
 # File: agents_and_tools.py
 
-import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+import heapq
+from itertools import chain, islice
+import math
 import os
 import time
-from typing import Optional, Type, List
+from typing import Iterable, Iterator, Optional, Type, List
 import uuid
 
-from langchain_core.messages import AIMessage
+from langchain_core.callbacks import adispatch_custom_event
 from langchain_core.runnables import RunnableWithMessageHistory
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool, StructuredTool
@@ -14,16 +19,36 @@ from langchain.agents import AgentExecutor, create_tool_calling_agent, create_re
 from langchain_openai import ChatOpenAI
 from langchain import hub
 from dotenv import load_dotenv
-import requests
-from service.ai.chat_history import get_chat_history
+import httpx
 from service.ai.prompts_and_model import retail_agent_prompt
+from service.ai.response_cache import normalize_message
+from service.ai.session_catalog import session_catalog_store
+from service.beckn.callbacks import BECKN_MODE, arequest_first, astream_action, run_on_app_loop
+from service.beckn.catalog_index import CATALOG_INDEX_ITEMS_PER_SEARCH, SORT_OPTIONS, catalog_index
+from service.beckn.client import beckn_client
+from service.beckn.search_cache import search_cache
+from service.schemas.catalog import CatalogItem, SelectedItem, SessionCatalog
 from service.schemas.product import ConfirmOrderResponse, SearchProductResponse, ProductItem, ProviderInfo, SelectProductResponse
+from config.logging_config import log_payload
 
 load_dotenv()
 
-BECKN_BASE_URL = os.getenv("BECKN_BASE_URL","https://bap-ps-client-deg.becknprotocol.io")
+logger = logging.getLogger(__name__)
+
+# LangChain's verbose agent trace prints every step to stdout, keep it for local debugging
+AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
+
 BAP_ID = os.getenv("BAP_ID","bap-ps-client-deg.becknprotocol.io")
 BAP_URI = os.getenv("BAP_URI","https://bap-ps-client-deg.becknprotocol.io")
+SEARCH_COUNTRY_CODE = "USA"
+SEARCH_CITY_CODE = "NANP:628"
+# Overall wait for a multi-domain search; the slowest domain is dropped rather than waited on past this
+BECKN_FANOUT_DEADLINE_SECONDS = float(os.getenv("BECKN_FANOUT_DEADLINE_SECONDS", "10"))
+# Search results shown and cached per query, and how they are ranked: price (lowest first), rating (highest first) or none (network order)
+BECKN_SEARCH_TOP_K = int(os.getenv("BECKN_SEARCH_TOP_K", "20"))
+BECKN_SEARCH_RANK_BY = os.getenv("BECKN_SEARCH_RANK_BY", "none").lower()
+
+_late_searches: set = set()
 
 
 
@@ -35,33 +60,25 @@ BAP_URI = os.getenv("BAP_URI","https://bap-ps-client-deg.becknprotocol.io")
 class SearchProductArgs(BaseModel):
     item_name: str = Field(description="Product name or keyword to search")
     session_id: str = Field(description="The session_id of the conversation and it should be from the config passed to the agent")
-    domain:str = Field(description="The domain of the product of services or schemes passed to the agent for search_request")
-
-
+    domain:str = Field(description="The domain of the product of services or schemes passed to the agent for search_request, comma separated to search several domains at once")
 
-def search_product_fn(item_name: str, session_id: str, domain:str) -> str:
-    print(f"[TOOL] Searching Beckn for: {item_name}")
-    print(f"[TOOL] Session ID: {session_id}")
-    print(f"[TOOL] Domain: {domain}")
 
-    chat_history = get_chat_history(session_id)
-    url = "https://bap-ps-client-deg.becknprotocol.io/search"
-    headers = {"Content-Type": "application/json"}
 
-    payload = {
+def _search_payload(item_name: str, domain: str, transaction_id: Optional[str] = None) -> dict:
+    return {
         "context": {
             "domain": domain,
             "action": "search",
             "location": {
-                "country": {"code": "USA"},
-                "city": {"code": "NANP:628"}
+                "country": {"code": SEARCH_COUNTRY_CODE},
+                "city": {"code": SEARCH_CITY_CODE}
             },
             "version": "1.1.0",
             "bap_id": BAP_ID,
             "bap_uri": BAP_URI,
             "bpp_id": "bpp-ps-network-deg.becknprotocol.io",
             "bpp_uri": "https://bpp-ps-network-deg.becknprotocol.io",
-            "transaction_id": str(uuid.uuid4()),
+            "transaction_id": transaction_id or str(uuid.uuid4()),
             "message_id": str(uuid.uuid4()),
             "timestamp": str(int(time.time()))
         },
@@ -73,61 +90,301 @@ def search_product_fn(item_name: str, session_id: str, domain:str) -> str:
             }
         }
     }
-    print("Search payload-----> ",payload)
 
+
+def _search_cache_key(item_name: str, domain: str) -> tuple:
+    return search_cache.key(domain, item_name, f"{SEARCH_COUNTRY_CODE}/{SEARCH_CITY_CODE}")
+
+
+def _iter_search_entries(responses: Iterable[dict]) -> Iterator[tuple]:
+    """Yield (item, provider, context) for every usable item, without copying any fields"""
+    for r in responses:
+        context = r.get("context", {})
+        for provider in r.get("message", {}).get("catalog", {}).get("providers", []):
+            for item in provider.get("items", []):
+                if item.get("id") and item.get("descriptor", {}).get("name"):
+                    yield item, provider, context
+
+
+def _as_float(value, default: float) -> float:
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        print("chat_history-----> ",chat_history.messages)
-       
-        items = []
-        product_selection_map = {}
-        responses = data.get("responses", [])
-
-        for r in responses:
-            providers = r.get("message", {}).get("catalog", {}).get("providers", [])
-            for provider in providers:
-                for item in provider.get("items", []):
-                    name = item.get("descriptor", {}).get("name")
-                    price = item.get("price", {}).get("value")
-                    currency = item.get("price", {}).get("currency")
-                    rating = item.get("rating", "N/A")
-                    item_id = item.get("id")
-                    provider_id = provider.get("id")
-                    provider_name = provider.get("descriptor", {}).get("name")
-                    if name and item_id:
-                        idx = len(items) + 1
-                        items.append({
-                            "index": idx,
-                            "name": name,
-                            "price": price,
-                            "currency": currency,
-                            "rating": rating,
-                            "provider_name": provider_name
-                        })
-                        product_selection_map[str(idx)] = {
-                            "product_id": item_id,
-                            "provider_id": provider_id,
-                            "product_name": name
-                        }
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _rank_value(price, rating) -> float:
+    """Sort key for the configured ranking; lower ranks first and unknown values sink to the end"""
+    if BECKN_SEARCH_RANK_BY == "price":
+        return _as_float(price, math.inf)
+    if BECKN_SEARCH_RANK_BY == "rating":
+        return -_as_float(rating, -math.inf)
+    return 0.0
+
+
+def _entry_rank(entry: tuple) -> float:
+    item = entry[0]
+    return _rank_value((item.get("price") or {}).get("value"), item.get("rating"))
+
+
+def _item_rank(item: CatalogItem) -> float:
+    return _rank_value(item.price, item.rating)
+
+
+def _top_k(entries: Iterable, key, limit: int) -> list:
+    """Best `limit` entries in O(limit) memory; ties and unranked mode keep the network order"""
+    if BECKN_SEARCH_RANK_BY in ("price", "rating"):
+        return heapq.nsmallest(limit, entries, key=key)
+    return list(islice(entries, limit))
+
+
+def _catalog_item(index: int, entry: tuple, domain: str) -> CatalogItem:
+    item, provider, context = entry
+    price = item.get("price") or {}
+    return CatalogItem(
+        index=index,
+        item_id=item["id"],
+        name=item["descriptor"]["name"],
+        price=price.get("value"),
+        currency=price.get("currency"),
+        rating=str(item.get("rating", "N/A")),
+        provider_id=provider.get("id"),
+        provider_name=provider.get("descriptor", {}).get("name"),
+        bpp_id=context.get("bpp_id"),
+        bpp_uri=context.get("bpp_uri"),
+        domain=context.get("domain", domain),
+        fulfillment_ids=item.get("fulfillment_ids") or [f["id"] for f in provider.get("fulfillments", []) if f.get("id")],
+    )
+
+
+def _parse_search_items(data: dict, domain: str, limit: int = BECKN_SEARCH_TOP_K) -> List[CatalogItem]:
+    """Walk the /search response once and build CatalogItems only for the top `limit` items"""
+    top = _top_k(_iter_search_entries(data.get("responses", [])), _entry_rank, limit)
+    return [_catalog_item(index, entry, domain) for index, entry in enumerate(top, 1)]
+
+
+def _renumber(items: Iterable[CatalogItem]) -> List[CatalogItem]:
+    return [item.model_copy(update={"index": index}) for index, item in enumerate(items, 1)]
+
+
+def _split_domains(domain: str) -> List[str]:
+    return [d.strip() for d in domain.split(",") if d.strip()]
+
+
+def _merge_domain_items(item_name: str, results: List[List[CatalogItem]]) -> List[CatalogItem]:
+    """Rank items from several domains by query overlap, then the configured ranking, interleaving equal matches"""
+    terms = set(normalize_message(item_name).split())
+    ranked = sorted(
+        ((item, position) for items in results for position, item in enumerate(items)),
+        key=lambda pair: (-len(terms & set(normalize_message(pair[0].name).split())), _item_rank(pair[0]), pair[1]),
+    )
+    return _renumber(item for item, _ in ranked[:BECKN_SEARCH_TOP_K])
+
+
+def _render_item(item: CatalogItem, labelled: bool) -> str:
+    return (
+        f"{item.index}. **{item.name}**\n"
+        f"   - Price: ₹{item.price} {item.currency}\n"
+        f"   - Rating: ⭐ {item.rating}\n"
+        f"   - Provider: {item.provider_name}\n"
+        + (f"   - Domain: {item.domain}\n" if labelled else "")
+        + "\n"
+    )
+
+
+def _render_results(items: List[CatalogItem], domain: str) -> str:
+    if not items:
+        return "Sorry, I couldn’t find any matching products. Please try a different query."
+
+    labelled = len(_split_domains(domain)) > 1
+    response_text = "Here are some products I found:\n\n" + "".join(_render_item(item, labelled) for item in items)
+
+    log_payload(logger, "Search results text", response_text)
+    return response_text
+
+
+def search_results_text(items: List[CatalogItem], item_name: str, domain: str, session_id: str, transaction_id: Optional[str] = None) -> str:
+    """Save the items as the session's current list and render them for the user"""
+    # Tools resolve later selections against this instead of raw JSON in the chat history
+    session_catalog_store.save(SessionCatalog(session_id=session_id, domain=domain, query=item_name, transaction_id=transaction_id, items=items))
+    return _render_results(items, domain)
 
+
+async def asearch_results_text(items: List[CatalogItem], item_name: str, domain: str, session_id: str, transaction_id: Optional[str] = None) -> str:
+    """Async variant of search_results_text"""
+    await session_catalog_store.asave(SessionCatalog(session_id=session_id, domain=domain, query=item_name, transaction_id=transaction_id, items=items))
+    return _render_results(items, domain)
+
+
+async def _acollect_search(payload: dict, domain: str, limit: int = BECKN_SEARCH_TOP_K) -> List[CatalogItem]:
+    """Aggregate on_search callbacks until the deadline, keeping a running top-K and surfacing each provider batch as it lands"""
+    top: List[CatalogItem] = []
+    responses = 0
+    async for response in astream_action("search", payload):
+        responses += 1
+        items = _parse_search_items({"responses": [response]}, domain, limit)
         if not items:
-            return "Sorry, I couldn’t find any matching products. Please try a different query."
-
-        response_text = "Here are some products I found:\n\n"
-        for item in items:
-            response_text += (
-                f"{item['index']}. **{item['name']}**\n"
-                f"   - Price: ₹{item['price']} {item['currency']}\n"
-                f"   - Rating: ⭐ {item['rating']}\n"
-                f"   - Provider: {item['provider_name']}\n\n"
-            )
-        
-        
-        print("response_text-----> ",response_text)
-        chat_history.messages.append(AIMessage(content=json.dumps({"search_response": data})))
-        return response_text
+            continue
+        top = _top_k(chain(top, items), _item_rank, limit)
+        try:
+            await adispatch_custom_event("beckn_partial_results", {
+                "responses": responses,
+                "items": [{"name": item.name, "price": item.price, "currency": item.currency, "provider_name": item.provider_name, "domain": item.domain} for item in items],
+            })
+        except Exception:
+            # Not inside a LangChain run, e.g. a background cache refresh
+            pass
+    return _renumber(top)
+
+
+async def _apost_action(action: str, payload: dict) -> dict:
+    if BECKN_MODE == "callback":
+        return await arequest_first(action, payload)
+    return await beckn_client.apost(action, payload)
+
+
+def _post_action(action: str, payload: dict) -> dict:
+    if BECKN_MODE == "callback":
+        return run_on_app_loop(arequest_first(action, payload))
+    return beckn_client.post(action, payload)
+
+
+def _index_sort() -> Optional[str]:
+    return {"price": "price_asc", "rating": "rating_desc"}.get(BECKN_SEARCH_RANK_BY)
+
+
+def _index_results(item_name: str, domain: str, items: List[CatalogItem]) -> List[CatalogItem]:
+    """Mirror a wider slice of the results into the local index and keep the top-K for the reply"""
+    catalog_index.add(item_name, domain, items)
+    return _renumber(items[:BECKN_SEARCH_TOP_K])
+
+
+def _indexed_search(item_name: str, domain: str) -> Optional[List[CatalogItem]]:
+    items = catalog_index.answer(item_name, domain, _index_sort(), BECKN_SEARCH_TOP_K)
+    if items is None:
+        return None
+    logger.info("Served search from the local catalog index", extra={"item_name": item_name, "domain": domain})
+    catalog_index.remember(item_name, domain, items)
+    return _renumber(items)
+
+
+def _fetch_search(item_name: str, domain: str, transaction_id: Optional[str] = None) -> List[CatalogItem]:
+    catalog_index.record_query(item_name, domain)
+    key = _search_cache_key(item_name, domain)
+    items = search_cache.lookup(key)
+    if items is None:
+        items = _indexed_search(item_name, domain)
+    if items is None:
+        payload = _search_payload(item_name, domain, transaction_id)
+        log_payload(logger, "Search payload", payload)
+        if BECKN_MODE == "callback":
+            items = run_on_app_loop(_acollect_search(payload, domain, CATALOG_INDEX_ITEMS_PER_SEARCH))
+        else:
+            items = _parse_search_items(beckn_client.post("search", payload), domain, CATALOG_INDEX_ITEMS_PER_SEARCH)
+        items = _index_results(item_name, domain, items)
+        search_cache.store(key, items)
+    return items
+
+
+async def _afetch_network(item_name: str, domain: str, transaction_id: Optional[str] = None) -> List[CatalogItem]:
+    payload = _search_payload(item_name, domain, transaction_id)
+    log_payload(logger, "Search payload", payload)
+    if BECKN_MODE == "callback":
+        items = await _acollect_search(payload, domain, CATALOG_INDEX_ITEMS_PER_SEARCH)
+    else:
+        # Only parsed items are kept, the raw payload is dropped here
+        items = _parse_search_items(await beckn_client.apost("search", payload), domain, CATALOG_INDEX_ITEMS_PER_SEARCH)
+    return _index_results(item_name, domain, items)
+
+
+async def _afetch_search(item_name: str, domain: str, transaction_id: Optional[str] = None) -> List[CatalogItem]:
+    catalog_index.record_query(item_name, domain)
+
+    async def fetch():
+        items = _indexed_search(item_name, domain)
+        if items is None:
+            items = await _afetch_network(item_name, domain, transaction_id)
+        return items
+
+    return await search_cache.get_or_fetch(_search_cache_key(item_name, domain), fetch)
+
+
+async def arefresh_search(item_name: str, domain: str) -> None:
+    """Re-run a recent query against the network for the catalog index refresher"""
+    search_cache.store(_search_cache_key(item_name, domain), await _afetch_network(item_name, domain))
+
+
+def _fanout_search(item_name: str, domains: List[str], transaction_id: Optional[str] = None) -> List[List[CatalogItem]]:
+    """Search every domain in parallel threads and keep whatever arrives before the deadline"""
+    executor = ThreadPoolExecutor(max_workers=len(domains))
+    futures = {executor.submit(_fetch_search, item_name, domain, transaction_id): domain for domain in domains}
+    done, pending = wait(futures, timeout=BECKN_FANOUT_DEADLINE_SECONDS)
+    executor.shutdown(wait=False)
+    for future in pending:
+        logger.warning("Search missed the %ss fan-out deadline", BECKN_FANOUT_DEADLINE_SECONDS, extra={"domain": futures[future]})
+    return _fanout_results(futures, done)
+
+
+async def _afanout_search(item_name: str, domains: List[str], transaction_id: Optional[str] = None) -> List[List[CatalogItem]]:
+    """Search every domain concurrently and keep whatever arrives before the deadline"""
+    tasks = {asyncio.ensure_future(_afetch_search(item_name, domain, transaction_id)): domain for domain in domains}
+    done, pending = await asyncio.wait(tasks, timeout=BECKN_FANOUT_DEADLINE_SECONDS)
+    for task in pending:
+        # Late domains are left to finish so their results land in the search cache
+        logger.warning("Search missed the %ss fan-out deadline", BECKN_FANOUT_DEADLINE_SECONDS, extra={"domain": tasks[task]})
+        _late_searches.add(task)
+        task.add_done_callback(_discard_late_search)
+    return _fanout_results(tasks, done)
+
+
+def _discard_late_search(task: asyncio.Task) -> None:
+    _late_searches.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Late search failed: %s", task.exception())
+
+
+def _fanout_results(futures: dict, done: set) -> List[List[CatalogItem]]:
+    results, errors = [], []
+    for future in done:
+        if future.exception() is not None:
+            logger.warning("Search failed: %s", future.exception(), extra={"domain": futures[future]})
+            errors.append(future.exception())
+        else:
+            results.append(future.result())
+    if errors and len(errors) == len(futures):
+        raise errors[0]
+    return results
+
+
+def search_product_fn(item_name: str, session_id: str, domain:str) -> str:
+    logger.info("Searching Beckn", extra={"item_name": item_name, "domain": domain})
+    # Select and confirm reuse it; results served from a cache still get their own transaction
+    transaction_id = str(uuid.uuid4())
+
+    try:
+        domains = _split_domains(domain)
+        if len(domains) > 1:
+            items = _merge_domain_items(item_name, _fanout_search(item_name, domains, transaction_id))
+        else:
+            items = _fetch_search(item_name, domain, transaction_id)
+        return search_results_text(items, item_name, domain, session_id, transaction_id)
+
+    except Exception as e:
+        return f"Oops! Something went wrong while searching for products: {e}"
+
+
+async def asearch_product_fn(item_name: str, session_id: str, domain:str) -> str:
+    """Async variant of search_product_fn used when the agent runs via ainvoke"""
+    logger.info("Searching Beckn", extra={"item_name": item_name, "domain": domain})
+    transaction_id = str(uuid.uuid4())
+
+    try:
+        domains = _split_domains(domain)
+        if len(domains) > 1:
+            items = _merge_domain_items(item_name, await _afanout_search(item_name, domains, transaction_id))
+        else:
+            items = await _afetch_search(item_name, domain, transaction_id)
+        return await asearch_results_text(items, item_name, domain, session_id, transaction_id)
 
     except Exception as e:
         return f"Oops! Something went wrong while searching for products: {e}"
@@ -135,6 +392,7 @@ def search_product_fn(item_name: str, session_id: str, domain:str) -> str:
 
 search_tool = StructuredTool.from_function(
     func=search_product_fn,
+    coroutine=asearch_product_fn,
     name="beckn_search_api",
     description="Call this tool to search for products, serivces or schemes on beckn open network",
     args_schema=SearchProductArgs,
@@ -149,20 +407,31 @@ search_tool = StructuredTool.from_function(
 ## ----------------------------------------
 
 class BecknSelectArgs(BaseModel):
-    bpp_id: str = Field(description="The bpp_id of the catalog from search_response")
-    bpp_uri: str = Field(description="The bpp_uri of the catalog from search_response")
-    item_id: str = Field(description="The item_id of the catalog from search_response")
-    provider_id: str = Field(description="The provider_id of the item from search_response")
-    domain: str = Field(description="The domain of the catalog from search_response")
+    item_number: Optional[int] = Field(default=None, description="The number of the item in the last search results list that the user picked")
+    item_id: Optional[str] = Field(default=None, description="The item_id of the item, only when the user did not pick by number")
     session_id:str = Field(description="The session_id of the conversation and it should be from the config passed to the agent")
 
 
-def select_product_fn(bpp_id:str, bpp_uri:str, item_id:str, provider_id:str, domain:str, session_id:str):
-    """ Can be used to call beckn select api"""
-    print(f"[TOOL] Calling beckn select api for: {item_id} with provider: {provider_id} and session: {session_id}")
-    url = f"{BECKN_BASE_URL}/select"
-    headers = {"Content-Type": "application/json"}
-    payload = {
+def _resolve_item(catalog: Optional[SessionCatalog], item_number: Optional[int], item_id: Optional[str]) -> Optional[CatalogItem]:
+    if catalog is None:
+        return None
+    item = None
+    if item_number is not None:
+        item = catalog.by_index(item_number)
+    if item is None and item_id:
+        item = catalog.by_item_id(item_id)
+    return item
+
+
+def _transaction_id(catalog: SessionCatalog) -> str:
+    # Catalogs stored before transaction ids were kept get one at their next select
+    if catalog.transaction_id is None:
+        catalog.transaction_id = str(uuid.uuid4())
+    return catalog.transaction_id
+
+
+def _select_payload(bpp_id:str, bpp_uri:str, item_id:str, provider_id:str, domain:str, transaction_id:str) -> dict:
+    return {
             "context": {
                 "domain": domain,
                 "action": "select",
@@ -179,7 +448,9 @@ def select_product_fn(bpp_id:str, bpp_uri:str, item_id:str, provider_id:str, dom
                 "bap_uri": BAP_URI,
                 "bpp_id": bpp_id,
                 "bpp_uri": bpp_uri,
-                "timestamp": "1750945005"
+                "transaction_id": transaction_id,
+                "message_id": str(uuid.uuid4()),
+                "timestamp": str(int(time.time()))
             },
             "message": {
                 "order": {
@@ -194,18 +465,87 @@ def select_product_fn(bpp_id:str, bpp_uri:str, item_id:str, provider_id:str, dom
                 }
             }
         }
-    print("\n\nselect payload-----> ",payload, "\n\n")
-    response = requests.post(url, headers=headers, json=payload)
-    data = response.json()
-    print("data-----> ",data.get("responses", {}))
-    chat_history = get_chat_history(session_id)
-    chat_history.messages.append(AIMessage(content=json.dumps({"select_response": data})))
-    return data
-   
+
+
+def _record_select_response(data: dict, catalog: SessionCatalog, item: CatalogItem) -> SelectProductResponse:
+    responses = data.get("responses") or []
+    order = responses[0].get("message", {}).get("order", {}) if responses else {}
+    if not order:
+        return SelectProductResponse(success=False, message=f"Sorry, I couldn’t select {item.name}. Please try again.")
+
+    fulfillments = order.get("fulfillments") or []
+    price = order.get("quote", {}).get("price", {})
+    selected = SelectedItem(
+        item=item,
+        fulfillment_id=fulfillments[0].get("id") if fulfillments else (item.fulfillment_ids[0] if item.fulfillment_ids else None),
+        quote_value=price.get("value", item.price),
+        quote_currency=price.get("currency", item.currency),
+    )
+    catalog.selected = selected
+    catalog.order_id = None
+    # Both the fast path and the agent prompt ask for confirmation after a successful select
+    catalog.awaiting_confirmation = True
+    return SelectProductResponse(
+        success=True,
+        message=f"Selected {item.name} from {item.provider_name} for ₹{selected.quote_value} {selected.quote_currency}.",
+        context={"item_number": item.index, "item_name": item.name},
+    )
+
+
+def _item_not_found() -> SelectProductResponse:
+    return SelectProductResponse(success=False, message="Sorry, I couldn’t find the product. Please try again.")
+
+
+def _select_failed(item: CatalogItem, error: Exception) -> SelectProductResponse:
+    if isinstance(error, httpx.HTTPError):
+        return SelectProductResponse(success=False, message=f"Sorry, I couldn’t select {item.name} due to network error: {error}")
+    # Eg. a BAP answering with a body that is not JSON
+    return SelectProductResponse(success=False, message=f"Sorry, I couldn’t select {item.name}: {error}")
+
+
+def select_product_fn(session_id:str, item_number: Optional[int] = None, item_id: Optional[str] = None) -> SelectProductResponse:
+    """ Can be used to call beckn select api"""
+    # Read past the cache so the number refers to this session's latest list, whichever worker stored it
+    catalog = session_catalog_store.get(session_id, fresh=True)
+    item = _resolve_item(catalog, item_number, item_id)
+    if item is None:
+        return _item_not_found()
+    logger.info("Calling Beckn select", extra={"item_id": item.item_id, "provider_id": item.provider_id})
+    payload = _select_payload(item.bpp_id, item.bpp_uri, item.item_id, item.provider_id, item.domain, _transaction_id(catalog))
+    log_payload(logger, "Select payload", payload)
+    try:
+        data = _post_action("select", payload)
+        result = _record_select_response(data, catalog, item)
+    except Exception as e:
+        return _select_failed(item, e)
+    if result.success:
+        session_catalog_store.save(catalog)
+    return result
+
+
+async def aselect_product_fn(session_id:str, item_number: Optional[int] = None, item_id: Optional[str] = None) -> SelectProductResponse:
+    """Async variant of select_product_fn used when the agent runs via ainvoke"""
+    catalog = await session_catalog_store.aget(session_id, fresh=True)
+    item = _resolve_item(catalog, item_number, item_id)
+    if item is None:
+        return _item_not_found()
+    logger.info("Calling Beckn select", extra={"item_id": item.item_id, "provider_id": item.provider_id})
+    payload = _select_payload(item.bpp_id, item.bpp_uri, item.item_id, item.provider_id, item.domain, _transaction_id(catalog))
+    log_payload(logger, "Select payload", payload)
+    try:
+        data = await _apost_action("select", payload)
+        result = _record_select_response(data, catalog, item)
+    except Exception as e:
+        return _select_failed(item, e)
+    if result.success:
+        await session_catalog_store.asave(catalog)
+    return result
+
 select_tool = StructuredTool.from_function(
     func=select_product_fn,
+    coroutine=aselect_product_fn,
     name="beckn_select_api",
-    description="Call the beckn select api to select an item and provider",
+    description="Call the beckn select api to select an item from the last search results by its number in the list",
     args_schema=BecknSelectArgs,
     return_direct=False,
 )
@@ -220,87 +560,144 @@ select_tool = StructuredTool.from_function(
 
 
 class ConfirmOrderArgs(BaseModel):
-    bpp_id: str = Field(description="The bpp_id of the catalog from select_response")
-    bpp_uri: str = Field(description="The bpp_uri of the catalog from select_response")
-    item_id: str = Field(description="The item_id of the catalog from select_response")
-    provider_id: str = Field(description="The provider_id of the item from select_response")
-    domain: str = Field(description="The domain of the catalog from select_response")
-    fulfillment_id: str = Field(description="The fulfillment_id of the item from select_response")
     session_id:str = Field(description="The session_id of the conversation and it should be from the config passed to the agent")
 
 
-def confirm_order_fn(bpp_id: str, bpp_uri: str, item_id: str, provider_id: str, domain: str, fulfillment_id: str, session_id: str) -> ConfirmOrderResponse:
-    print(f"[TOOL] Confirming order for: {item_id} with provider: {provider_id} and session: {session_id}")
-
-    try:
-        url = f"{BECKN_BASE_URL}/confirm"
-        headers = {"Content-Type": "application/json"}
-
-        payload = {
-            "context": {
-                "domain": domain,
-                "action": "confirm",
-                "location": {
-                    "country": {"code": "USA"},
-                    "city": {"code": "NANP:628"}
-                },
-                "version": "1.1.0",
-                "bap_id": BAP_ID,
-                "bap_uri": BAP_URI,
-                "bpp_id": bpp_id,
-                "bpp_uri": bpp_uri,
-                "transaction_id": str(uuid.uuid4()),
-                "message_id": str(uuid.uuid4()),
-                "timestamp": str(int(time.time()))
+def _confirm_payload(bpp_id: str, bpp_uri: str, item_id: str, provider_id: str, domain: str, fulfillment_id: str, transaction_id: str) -> dict:
+    return {
+        "context": {
+            "domain": domain,
+            "action": "confirm",
+            "location": {
+                "country": {"code": "USA"},
+                "city": {"code": "NANP:628"}
             },
-            "message": {
-                "order": {
-                    "provider": {
-                        "id": provider_id
-                    },
-                    "items": [
-                        {
-                            "id": item_id
-                        }
-                    ],
-                    "fulfillments": [
-                        {
-                            "id": fulfillment_id,
-                            "customer": {
-                                "person": {
-                                    "name": "Lisa"
-                                },
-                                "contact": {
-                                    "phone": "876756454",
-                                    "email": "LisaS@mailinator.com"
-                                }
+            "version": "1.1.0",
+            "bap_id": BAP_ID,
+            "bap_uri": BAP_URI,
+            "bpp_id": bpp_id,
+            "bpp_uri": bpp_uri,
+            "transaction_id": transaction_id,
+            "message_id": str(uuid.uuid4()),
+            "timestamp": str(int(time.time()))
+        },
+        "message": {
+            "order": {
+                "provider": {
+                    "id": provider_id
+                },
+                "items": [
+                    {
+                        "id": item_id
+                    }
+                ],
+                "fulfillments": [
+                    {
+                        "id": fulfillment_id,
+                        "customer": {
+                            "person": {
+                                "name": "Lisa"
+                            },
+                            "contact": {
+                                "phone": "876756454",
+                                "email": "LisaS@mailinator.com"
                             }
                         }
-                    ]
-                }
+                    }
+                ]
             }
         }
+    }
+
+
+def _record_confirm_response(data: dict, catalog: SessionCatalog) -> ConfirmOrderResponse:
+    item = catalog.selected.item
+    responses = data.get("responses") or []
+    order = responses[0].get("message", {}).get("order", {}) if responses else {}
+    order_id = order.get("id")
+    if not order_id:
+        return ConfirmOrderResponse(
+            success=False,
+            message="❌ Sorry, something went wrong while confirming the order. Please try again.",
+            product_id=item.item_id
+        )
+    catalog.order_id = order_id
+    catalog.awaiting_confirmation = False
+    return ConfirmOrderResponse(
+        success=True,
+        message=f"✅ Order confirmed for {item.name}! Order ID: {order_id}.",
+        order_id=order_id,
+        product_id=item.item_id
+    )
+
+
+def _nothing_selected() -> ConfirmOrderResponse:
+    return ConfirmOrderResponse(success=False, message="Please select a product before confirming the order.")
 
-        print(f"[TOOL] Sending confirm order request: {payload}")
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        chat_history = get_chat_history(session_id)
-        chat_history.messages.append(AIMessage(content=json.dumps({"confirm_order_response": data})))
 
-        return data
+def confirm_order_fn(session_id: str) -> ConfirmOrderResponse:
+    # Never confirm a selection this worker cached if the user has since changed it elsewhere
+    catalog = session_catalog_store.get(session_id, fresh=True)
+    if catalog is None or catalog.selected is None:
+        return _nothing_selected()
+    selected = catalog.selected
+    item = selected.item
+    logger.info("Confirming order", extra={"item_id": item.item_id, "provider_id": item.provider_id})
 
-    except requests.exceptions.RequestException as e:
+    try:
+        payload = _confirm_payload(item.bpp_id, item.bpp_uri, item.item_id, item.provider_id, item.domain, selected.fulfillment_id, _transaction_id(catalog))
+
+        log_payload(logger, "Confirm payload", payload)
+        data = _post_action("confirm", payload)
+        result = _record_confirm_response(data, catalog)
+        if result.success:
+            session_catalog_store.save(catalog)
+        return result
+
+    except httpx.HTTPError as e:
         return ConfirmOrderResponse(
             success=False,
             message=f"❌ Failed to confirm the order due to network error: {str(e)}",
-            product_id=item_id
+            product_id=item.item_id
         )
     except Exception as e:
         return ConfirmOrderResponse(
             success=False,
             message=f"❌ Failed to confirm the order: {str(e)}",
-            product_id=item_id
+            product_id=item.item_id
+        )
+
+
+async def aconfirm_order_fn(session_id: str) -> ConfirmOrderResponse:
+    """Async variant of confirm_order_fn used when the agent runs via ainvoke"""
+    catalog = await session_catalog_store.aget(session_id, fresh=True)
+    if catalog is None or catalog.selected is None:
+        return _nothing_selected()
+    selected = catalog.selected
+    item = selected.item
+    logger.info("Confirming order", extra={"item_id": item.item_id, "provider_id": item.provider_id})
+
+    try:
+        payload = _confirm_payload(item.bpp_id, item.bpp_uri, item.item_id, item.provider_id, item.domain, selected.fulfillment_id, _transaction_id(catalog))
+
+        log_payload(logger, "Confirm payload", payload)
+        data = await _apost_action("confirm", payload)
+        result = _record_confirm_response(data, catalog)
+        if result.success:
+            await session_catalog_store.asave(catalog)
+        return result
+
+    except httpx.HTTPError as e:
+        return ConfirmOrderResponse(
+            success=False,
+            message=f"❌ Failed to confirm the order due to network error: {str(e)}",
+            product_id=item.item_id
+        )
+    except Exception as e:
+        return ConfirmOrderResponse(
+            success=False,
+            message=f"❌ Failed to confirm the order: {str(e)}",
+            product_id=item.item_id
         )
 
 
@@ -308,8 +705,9 @@ def confirm_order_fn(bpp_id: str, bpp_uri: str, item_id: str, provider_id: str,
 
 confirm_tool = StructuredTool.from_function(
     func=confirm_order_fn,
+    coroutine=aconfirm_order_fn,
     name="beckn_confirm_api",
-    description="Confirm an order by providing product_id.",
+    description="Confirm the order for the item the user selected with beckn_select_api.",
     args_schema=ConfirmOrderArgs,
     return_direct=False,
 )
@@ -322,15 +720,82 @@ confirm_tool = StructuredTool.from_function(
 
 
 
+## ----------------------------------------
+## 4. Define refine tool
+## ----------------------------------------
+
+
+class RefineResultsArgs(BaseModel):
+    session_id: str = Field(description="The session_id of the conversation and it should be from the config passed to the agent")
+    keywords: Optional[str] = Field(default=None, description="Extra words the items must contain, eg. a brand or capacity")
+    min_price: Optional[float] = Field(default=None, description="Lowest price the user accepts")
+    max_price: Optional[float] = Field(default=None, description="Highest price the user accepts")
+    min_rating: Optional[float] = Field(default=None, description="Lowest rating the user accepts")
+    sort_by: Optional[str] = Field(default=None, description="One of price_asc, price_desc or rating_desc")
+
+
+def refine_results(catalog: Optional[SessionCatalog], keywords: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None, min_rating: Optional[float] = None, sort_by: Optional[str] = None) -> Optional[List[CatalogItem]]:
+    """Filter and sort the session's last search results from the local catalog index, None without a search"""
+    if catalog is None or not catalog.query or not catalog.domain:
+        return None
+    items = catalog_index.search(
+        keywords,
+        domains=_split_domains(catalog.domain),
+        within=catalog.query,
+        min_price=min_price,
+        max_price=max_price,
+        min_rating=min_rating,
+        sort_by=sort_by if sort_by in SORT_OPTIONS else None,
+        limit=BECKN_SEARCH_TOP_K,
+    )
+    return _renumber(items)
+
+
+def refine_results_fn(session_id: str, keywords: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None, min_rating: Optional[float] = None, sort_by: Optional[str] = None) -> str:
+    logger.info("Refining results", extra={"keywords": keywords, "min_price": min_price, "max_price": max_price, "min_rating": min_rating, "sort_by": sort_by})
+    catalog = session_catalog_store.get(session_id)
+    items = refine_results(catalog, keywords, min_price, max_price, min_rating, sort_by)
+    if items is None:
+        return "Please search for a product first, then I can filter the results."
+    if not items:
+        return "None of the items from your last search match that. Would you like me to search again?"
+    return search_results_text(items, catalog.query, catalog.domain, session_id, catalog.transaction_id)
+
+
+async def arefine_results_fn(session_id: str, keywords: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None, min_rating: Optional[float] = None, sort_by: Optional[str] = None) -> str:
+    """Async variant of refine_results_fn used when the agent runs via ainvoke"""
+    logger.info("Refining results", extra={"keywords": keywords, "min_price": min_price, "max_price": max_price, "min_rating": min_rating, "sort_by": sort_by})
+    catalog = await session_catalog_store.aget(session_id)
+    items = refine_results(catalog, keywords, min_price, max_price, min_rating, sort_by)
+    if items is None:
+        return "Please search for a product first, then I can filter the results."
+    if not items:
+        return "None of the items from your last search match that. Would you like me to search again?"
+    return await asearch_results_text(items, catalog.query, catalog.domain, session_id, catalog.transaction_id)
+
+
+refine_tool = StructuredTool.from_function(
+    func=refine_results_fn,
+    coroutine=arefine_results_fn,
+    name="beckn_refine_results",
+    description="Filter or sort the items of the last search (price range, minimum rating, keywords, cheapest or highest rated first) without searching again",
+    args_schema=RefineResultsArgs,
+    return_direct=True,
+)
+
+
+
+
 # Tools list
 tools = [
     search_tool,
     select_tool,
-    confirm_tool
+    confirm_tool,
+    refine_tool
 ]
 
 # Load OpenAI LLM
-llm = ChatOpenAI(model="gpt-4o", temperature=0.0)
+llm = ChatOpenAI(model="gpt-4o", temperature=0.0, name="retail_agent_llm", stream_usage=True)
 
 # Create the tool-using agent
 retail_agent = create_tool_calling_agent(
@@ -343,7 +808,8 @@ retail_agent = create_tool_calling_agent(
 retail_agent_executor = AgentExecutor.from_agent_and_tools(
     agent=retail_agent,
     tools=tools,
-    verbose=True,
+    verbose=AGENT_VERBOSE,
     handle_parsing_errors=True,
+    name="retail_agent",
     
 )
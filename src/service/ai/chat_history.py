@@ -1,21 +1,449 @@
-from langchain_core.chat_history import InMemoryChatMessageHistory
+import asyncio
+import logging
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Sequence
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from bson import Binary
+from dotenv import load_dotenv
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage, message_to_dict, messages_from_dict
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableLambda
 from langchain_core.runnables.history import RunnableWithMessageHistory
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config.database import CHAT_HISTORY_COLLECTION, get_database
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# "memory" keeps histories in this process only, "mongodb" shares them across workers
+CHAT_HISTORY_BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "memory")
+# How long a session may sit unused in MongoDB before its TTL index removes it
+CHAT_HISTORY_SESSION_TTL_SECONDS = int(os.getenv("CHAT_HISTORY_SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+CHAT_HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("CHAT_HISTORY_FLUSH_INTERVAL_SECONDS", "0.5"))
+
+CHAT_HISTORY_MAX_SESSIONS = int(os.getenv("CHAT_HISTORY_MAX_SESSIONS", "10000"))
+CHAT_HISTORY_IDLE_TTL_SECONDS = float(os.getenv("CHAT_HISTORY_IDLE_TTL_SECONDS", "3600"))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "50"))
+CHAT_HISTORY_MAX_BYTES = int(os.getenv("CHAT_HISTORY_MAX_BYTES", str(256 * 1024)))
+# Messages larger than this (typically raw Beckn tool payloads) are kept zlib-compressed
+CHAT_HISTORY_COMPRESS_THRESHOLD_BYTES = int(os.getenv("CHAT_HISTORY_COMPRESS_THRESHOLD_BYTES", "2048"))
+
+# Prompts get the rolling summary plus the newest messages that fit this many (approximate) tokens
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+# Messages always kept verbatim; older ones are folded into the summary
+CHAT_HISTORY_VERBATIM_MESSAGES = int(os.getenv("CHAT_HISTORY_VERBATIM_MESSAGES", "6"))
+# Older messages are folded once this many have piled up, so the summarizer runs every few turns
+CHAT_HISTORY_SUMMARY_BATCH_MESSAGES = int(os.getenv("CHAT_HISTORY_SUMMARY_BATCH_MESSAGES", "4"))
+
+
+def _encode_message(message: BaseMessage) -> tuple[bool, bytes]:
+    raw = json.dumps(message_to_dict(message)).encode()
+    if len(raw) > CHAT_HISTORY_COMPRESS_THRESHOLD_BYTES:
+        return True, zlib.compress(raw)
+    return False, raw
+
+
+def _decode_message(compressed: bool, payload: bytes) -> BaseMessage:
+    raw = zlib.decompress(payload) if compressed else payload
+    return messages_from_dict([json.loads(raw)])[0]
+
+
+class MongoHistoryBackend:
+    """Write-behind persistence of encoded history entries in MongoDB.
+
+    Appends are buffered per session and pushed by a background thread with a
+    single unordered bulk_write per flush interval.
+    """
+
+    def __init__(self, flush_interval: float = CHAT_HISTORY_FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self.collection = get_database()[CHAT_HISTORY_COLLECTION]
+        self.collection.create_index("updated_at", expireAfterSeconds=CHAT_HISTORY_SESSION_TTL_SECONDS)
+        self._pending: dict[str, list[dict]] = {}
+        # Sessions with a bulk_write under way; a session is only ever written by one flush at a time
+        self._inflight: set[str] = set()
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="chat-history-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher thread and write out anything still buffered"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing chat history")
+
+    def append(self, session_id: str, entry: tuple[bool, bytes]) -> None:
+        compressed, payload = entry
+        with self._lock:
+            self._pending.setdefault(session_id, []).append({"c": compressed, "p": Binary(payload)})
+
+    def flush(self, session_id: Optional[str] = None) -> None:
+        """Write out the buffered entries of one session or all of them.
+
+        Returns once every write of those sessions, including one another thread
+        started, has landed, so a read that follows sees them. Entries of a failed
+        write go back to the buffer for the next flush.
+        """
+        with self._lock:
+            # Waiting also keeps two writes of one session from racing and reordering its pushes
+            while self._inflight if session_id is None else session_id in self._inflight:
+                self._written.wait()
+            if session_id is None:
+                pending, self._pending = self._pending, {}
+            elif session_id in self._pending:
+                pending = {session_id: self._pending.pop(session_id)}
+            else:
+                return
+            self._inflight.update(pending)
+        if not pending:
+            return
+        failed = pending
+        try:
+            self._write(pending)
+            failed = {}
+        except BulkWriteError as e:
+            # Only the failed updates are retried, the others already landed
+            indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+            failed = {sid: entries for index, (sid, entries) in enumerate(pending.items()) if index in indexes}
+            raise
+        finally:
+            with self._lock:
+                for sid, entries in failed.items():
+                    self._pending[sid] = entries + self._pending.get(sid, [])
+                self._inflight.difference_update(pending)
+                self._written.notify_all()
+
+    def _write(self, pending: dict[str, list[dict]]) -> None:
+        now = datetime.now(timezone.utc)
+        self.collection.bulk_write([
+            UpdateOne(
+                {"_id": sid},
+                {
+                    "$push": {"messages": {"$each": entries, "$slice": -CHAT_HISTORY_MAX_MESSAGES}},
+                    "$set": {"updated_at": now},
+                    "$inc": {"total": len(entries)},
+                },
+                upsert=True,
+            )
+            for sid, entries in pending.items()
+        ], ordered=False)
+
+    def version(self, session_id: str) -> tuple[int, int]:
+        """Stored (total, summarized_upto) of a session, after pushing our own buffered writes"""
+        self.flush(session_id)
+        doc = self.collection.find_one({"_id": session_id}, {"_id": 0, "total": 1, "summarized_upto": 1})
+        if not doc:
+            return 0, 0
+        return doc.get("total", 0), doc.get("summarized_upto", 0)
+
+    def load(self, session_id: str) -> dict:
+        """Read-through of a session's entries and summary, after pushing our own buffered writes"""
+        self.flush(session_id)
+        doc = self.collection.find_one({"_id": session_id}, {"messages": 1, "total": 1, "summary": 1, "summarized_upto": 1})
+        if not doc:
+            return {"entries": [], "total": 0, "summary": None, "summarized_upto": 0}
+        entries = [(entry["c"], bytes(entry["p"])) for entry in doc.get("messages", [])]
+        return {
+            "entries": entries,
+            # Sessions written before positions were counted have no (or a partial) total
+            "total": max(doc.get("total", 0), len(entries)),
+            "summary": doc.get("summary"),
+            "summarized_upto": doc.get("summarized_upto", 0),
+        }
+
+    def save_summary(self, session_id: str, summary: str, summarized_upto: int) -> None:
+        self.collection.update_one(
+            {"_id": session_id, "summarized_upto": {"$not": {"$gte": summarized_upto}}},
+            {"$set": {"summary": summary, "summarized_upto": summarized_upto}},
+        )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._pending.pop(session_id, None)
+        self.collection.delete_one({"_id": session_id})
+
+
+class BoundedChatMessageHistory(BaseChatMessageHistory):
+    """In-memory chat history capped by message count and stored bytes.
+
+    Oldest messages are dropped first once either cap is exceeded. When a
+    backend is given every appended entry is also handed to it for persistence.
+
+    Prompts do not get the whole history: `prompt_messages` returns a rolling
+    summary of older turns plus the newest messages within a token budget.
+    Positions are counted over every message ever added (`total`), so the
+    summary keeps track of what it covers while old entries are dropped.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = CHAT_HISTORY_MAX_MESSAGES,
+        max_bytes: int = CHAT_HISTORY_MAX_BYTES,
+        session_id: Optional[str] = None,
+        backend: Optional[MongoHistoryBackend] = None,
+    ):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.session_id = session_id
+        self.backend = backend
+        self.nbytes = 0
+        self.last_access = time.monotonic()
+        self.loaded = False
+        self._entries: deque[tuple[bool, bytes]] = deque()
+        self._lock = threading.Lock()
+        self.total = 0
+        self.summary: Optional[str] = None
+        self.summarized_upto = 0
+
+    @property
+    def messages(self) -> list[BaseMessage]:  # type: ignore[override]
+        with self._lock:
+            entries = list(self._entries)
+        return [_decode_message(compressed, payload) for compressed, payload in entries]
+
+    async def aget_messages(self) -> list[BaseMessage]:
+        return self.messages
+
+    def add_message(self, message: BaseMessage) -> None:
+        entry = _encode_message(message)
+        self._append(entry)
+        with self._lock:
+            self.total += 1
+        if self.backend is not None:
+            self.backend.append(self.session_id, entry)
+
+    def _append(self, entry: tuple[bool, bytes]) -> None:
+        with self._lock:
+            self._entries.append(entry)
+            self.nbytes += len(entry[1])
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_messages or self.nbytes > self.max_bytes
+            ):
+                _, dropped = self._entries.popleft()
+                self.nbytes -= len(dropped)
+
+    def reload(self) -> None:
+        """Replace the hot copy with the persisted one"""
+        state = self.backend.load(self.session_id)
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.total = state["total"]
+            if state["summarized_upto"] >= self.summarized_upto:
+                self.summary = state["summary"]
+                self.summarized_upto = state["summarized_upto"]
+        for entry in state["entries"]:
+            self._append(entry)
+        self.loaded = True
+
+    def refresh(self) -> None:
+        """Reload the hot copy unless the persisted version shows no turn or summary written elsewhere"""
+        if self.loaded:
+            total, summarized_upto = self.backend.version(self.session_id)
+            with self._lock:
+                current = total == self.total and summarized_upto <= self.summarized_upto
+            if current:
+                return
+        self.reload()
+
+    def _unsummarized(self) -> tuple[int, list[tuple[bool, bytes]], Optional[str]]:
+        """Absolute position of the first message the summary does not cover, the entries from there on and the summary"""
+        with self._lock:
+            entries = list(self._entries)
+            first = self.total - len(entries)
+            start = max(self.summarized_upto, first)
+            return start, entries[start - first:], self.summary
+
+    def prompt_messages(self, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET) -> list[BaseMessage]:
+        """Rolling summary plus the newest unsummarized messages that fit the token budget"""
+        _, entries, summary = self._unsummarized()
+        head = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] if summary else []
+        budget = token_budget - count_tokens_approximately(head)
+        recent: list[BaseMessage] = []
+        for compressed, payload in reversed(entries):
+            message = _decode_message(compressed, payload)
+            budget -= count_tokens_approximately([message])
+            # The newest message is always kept, however long it is
+            if recent and budget < 0:
+                break
+            recent.append(message)
+        return head + recent[::-1]
+
+    def pending_summary(self) -> tuple[list[BaseMessage], int]:
+        """Messages due to be folded into the summary and the position the new summary will cover up to"""
+        start, entries, _ = self._unsummarized()
+        fold = len(entries) - CHAT_HISTORY_VERBATIM_MESSAGES
+        if fold < CHAT_HISTORY_SUMMARY_BATCH_MESSAGES:
+            return [], start
+        return [_decode_message(compressed, payload) for compressed, payload in entries[:fold]], start + fold
+
+    def set_summary(self, summary: str, summarized_upto: int) -> None:
+        with self._lock:
+            if summarized_upto <= self.summarized_upto:
+                return
+            self.summary = summary
+            self.summarized_upto = summarized_upto
+        if self.backend is not None:
+            self.backend.save_summary(self.session_id, summary, summarized_upto)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        for message in messages:
+            self.add_message(message)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.add_messages(messages)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.total = 0
+            self.summary = None
+            self.summarized_upto = 0
+        if self.backend is not None:
+            self.backend.delete(self.session_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def compressed_count(self) -> int:
+        return sum(1 for compressed, _ in self._entries if compressed)
+
+
+class ChatHistoryStore:
+    """Session id -> history map with LRU and idle-TTL eviction of whole sessions.
+
+    With a backend the map is a hot cache: misses are read through from the
+    backend, so evicting a session never loses it. `aget` also checks the
+    stored version first, so turns served by another worker are picked up;
+    request handlers use it so that MongoDB I/O stays off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = CHAT_HISTORY_MAX_SESSIONS,
+        idle_ttl: float = CHAT_HISTORY_IDLE_TTL_SECONDS,
+        backend: Optional[MongoHistoryBackend] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self.evicted_sessions = 0
+        self._sessions: "OrderedDict[str, BoundedChatMessageHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, session_id: str) -> BoundedChatMessageHistory:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = BoundedChatMessageHistory(session_id=session_id, backend=self.backend)
+                self._sessions[session_id] = history
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_sessions += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            history.last_access = now
+        return history
+
+    def get(self, session_id: str) -> BoundedChatMessageHistory:
+        history = self._entry(session_id)
+        if self.backend is not None and not history.loaded:
+            history.reload()
+        return history
+
+    async def aget(self, session_id: str) -> BoundedChatMessageHistory:
+        history = self._entry(session_id)
+        if self.backend is not None:
+            await asyncio.to_thread(history.refresh)
+        return history
+
+    def start(self) -> None:
+        if self.backend is not None:
+            self.backend.start()
+
+    def stop(self) -> None:
+        if self.backend is not None:
+            self.backend.stop()
+
+    def _evict_idle(self, now: float) -> None:
+        # Sessions are kept in access order, so the idle ones are all at the front
+        while self._sessions:
+            session_id, history = next(iter(self._sessions.items()))
+            if now - history.last_access < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evicted_sessions += 1
+
+    def stats(self) -> dict:
+        """Gauges describing the current memory footprint"""
+        with self._lock:
+            histories = list(self._sessions.values())
+        return {
+            "sessions": len(histories),
+            "messages": sum(len(h) for h in histories),
+            "bytes": sum(h.nbytes for h in histories),
+            "compressed_messages": sum(h.compressed_count() for h in histories),
+            "summarized_sessions": sum(1 for h in histories if h.summary),
+            "evicted_sessions": self.evicted_sessions,
+        }
+
+
+chat_history_store = ChatHistoryStore(
+    backend=MongoHistoryBackend() if CHAT_HISTORY_BACKEND == "mongodb" else None
+)
 
-chat_history = {
-    "default-session": InMemoryChatMessageHistory()
-}
 
 def get_chat_history(session_id: str = "default-session"):
-    if session_id not in chat_history:
-        chat_history[session_id] = InMemoryChatMessageHistory()
-    return chat_history[session_id]
+    return chat_history_store.get(session_id)
+
+
+async def aget_chat_history(session_id: str = "default-session"):
+    """History of the session, brought up to date with MongoDB without blocking the event loop"""
+    return await chat_history_store.aget(session_id)
 
 
 def with_session_memory(chain, memory_key="chat_history"):
+    """Give the chain the session's budgeted history and record the turn afterwards"""
+    def budget_history(x, config):
+        return {**x, memory_key: get_chat_history(config["configurable"]["session_id"]).prompt_messages()}
+
+    async def abudget_history(x, config):
+        return budget_history(x, config)
+
     return RunnableWithMessageHistory(
-        runnable=chain,
+        runnable=RunnableLambda(budget_history, afunc=abudget_history) | chain,
         get_session_history=get_chat_history,
         input_messages_key="input",
         history_messages_key=memory_key,
-    )
-
+    ).with_config(run_name="chat_turn")
@@ -0,0 +1,158 @@
+import re
+from typing import Optional
+
+from service.ai.agents_and_tools import aconfirm_order_fn, aselect_product_fn, asearch_results_text, refine_results
+from service.ai.response_cache import normalize_message
+from service.ai.session_catalog import session_catalog_store
+from service.schemas.catalog import SessionCatalog
+
+_ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+    "1st": 1, "2nd": 2, "3rd": 3, "4th": 4, "5th": 5,
+    "6th": 6, "7th": 7, "8th": 8, "9th": 9, "10th": 10,
+}
+
+# Whole-message patterns only; anything that does not match falls back to the LLM.
+# Only selection verbs: after "buy 2", "get 3" or "want 1" the number may be a quantity
+# rather than an item, and so may a number word ("two"); those are left to the agent.
+_SELECTION = re.compile(
+    r"^(?:please\s+)?"
+    r"(?:(?:i(?: would like| d like| want)?\s+(?:to\s+)?)?(?:select|choose|pick)\s+(?:please\s+)?)?"
+    r"(?:the\s+|number\s+|no\s+|item\s+|option\s+|product\s+)*"
+    r"(?P<choice>\d+|last|" + "|".join(_ORDINALS) + r")"
+    r"(?:\s+(?:one|item|option|product|please))*$"
+)
+# No casual acknowledgements ("ok", "sure"): a match places an order
+_YES = {
+    "yes", "y", "yeah", "yep", "yup", "confirm", "confirm it",
+    "yes please", "yes confirm", "yes confirm it", "please confirm", "go ahead", "do it",
+    "confirm the order", "yes confirm the order", "place the order", "place order",
+}
+_NO = {"no", "n", "nope", "cancel", "no thanks", "no thank you", "dont", "don t", "do not", "cancel it", "cancel the order"}
+
+# A rating bound needs a rating word ("rated 4", "over 4 stars"); a number counted in stars is never a price
+_RATING_FLOOR = re.compile(
+    r"\b(?:(?:rated|rating|ratings)\s+(?:of\s+)?(?:above|over|at least|min|minimum)?\s*(?P<rated>[1-5])(?:\s+(?:stars?|and above|plus))?"
+    r"|(?:above|over|at least|min|minimum)\s+(?P<stars>[1-5])\s+stars?(?:\s+(?:rating|rated))?"
+    r"|(?P<stars_up>[1-5])\s+stars?\s+(?:and above|and up|or more|plus))\b"
+)
+_AMOUNT = r"(?:rs\s+|inr\s+)?(?P<amount>\d+)(?!\d|\s*(?:stars?|ratings?)\b)(?:\s+(?:rs|inr|rupees))?\b"
+_PRICE_CAP = re.compile(r"\b(?:under|below|less than|cheaper than|up to|upto|within|max|maximum)\s+" + _AMOUNT)
+_PRICE_FLOOR = re.compile(r"\b(?:over|above|more than|at least|min|minimum)\s+" + _AMOUNT)
+# Checked in order, so explicit directions win over a bare "sort by price"
+_SORTS = {
+    "low to high": "price_asc", "high to low": "price_desc", "cheapest": "price_asc", "lowest price": "price_asc",
+    "most expensive": "price_desc", "sort by price": "price_asc",
+    "highest rated": "rating_desc", "best rated": "rating_desc", "top rated": "rating_desc", "sort by rating": "rating_desc",
+}
+# Words a refinement can contain besides its filters; anything else is treated as a keyword
+_REFINE_FILLER = {
+    "show", "me", "only", "just", "the", "ones", "one", "items", "products", "options", "results", "please",
+    "with", "a", "an", "those", "them", "that", "which", "are", "is", "and", "first", "now", "ok", "okay",
+    "filter", "list", "sort", "sorted", "by", "price", "priced", "of", "from", "rs", "inr", "rupees", "what", "about", "any",
+}
+
+
+def match_selection(message: str, catalog: SessionCatalog) -> Optional[int]:
+    """Item number the message picks from the catalog, or None when unsure"""
+    match = _SELECTION.match(normalize_message(message))
+    if not match:
+        return None
+    choice = match.group("choice")
+    if choice == "last":
+        index = len(catalog.items)
+    elif choice.isdigit():
+        index = int(choice)
+    else:
+        index = _ORDINALS[choice]
+    return index if catalog.by_index(index) else None
+
+
+def match_refinement(message: str) -> Optional[dict]:
+    """refine_results arguments for a filter/sort follow-up such as "only under 500", or None"""
+    text = normalize_message(message)
+    refinement = {}
+    # Words taken up by filters and sorts
+    consumed = 0
+    for pattern, field in ((_RATING_FLOOR, "min_rating"), (_PRICE_CAP, "max_price"), (_PRICE_FLOOR, "min_price")):
+        match = pattern.search(text)
+        if match:
+            refinement[field] = float(match.group(match.lastgroup))
+            consumed += len(match.group(0).split())
+            text = text[:match.start()] + " " + text[match.end():]
+    for phrase, sort_by in _SORTS.items():
+        match = re.search(rf"\b{phrase}\b", text)
+        if match:
+            refinement["sort_by"] = sort_by
+            consumed += len(phrase.split())
+            text = text[:match.start()] + " " + text[match.end():]
+            break
+    if not refinement:
+        return None
+    keywords = [word for word in text.split() if word not in _REFINE_FILLER]
+    # "what is the cheapest way to save energy" is a new question that happens to contain a sort word
+    if len(keywords) > consumed:
+        return None
+    if keywords:
+        refinement["keywords"] = " ".join(keywords)
+    return refinement
+
+
+def match_confirmation(message: str) -> Optional[bool]:
+    """True for a clear yes, False for a clear no, None when unsure"""
+    normalized = normalize_message(message)
+    if normalized in _YES:
+        return True
+    if normalized in _NO:
+        return False
+    return None
+
+
+async def run_fast_path(message: str, session_id: str) -> Optional[str]:
+    """Answer selection, yes/no confirmation and result refinement turns without the router or the agent.
+
+    Returns None whenever the message is not an unambiguous selection,
+    confirmation or refinement for this session's catalog. Yes/no is only
+    taken as an answer on the turn right after a select asked for it; every
+    turn clears that state, whichever way it is answered.
+    """
+    catalog = await session_catalog_store.aget(session_id)
+    if catalog is None:
+        return None
+
+    if catalog.awaiting_confirmation:
+        # Another worker may have answered or changed the selection since this copy was cached
+        catalog = await session_catalog_store.aget(session_id, fresh=True)
+        if catalog is None:
+            return None
+    if catalog.awaiting_confirmation:
+        catalog.awaiting_confirmation = False
+        answer = match_confirmation(message)
+        if answer is False:
+            catalog.selected = None
+        await session_catalog_store.asave(catalog)
+        if answer is True:
+            result = await aconfirm_order_fn(session_id)
+            if result.success:
+                return f"{result.message} Your product will be delivered soon.\n\nCan I help you with anything else?"
+            return result.message
+        if answer is False:
+            return "Okay, I haven’t placed the order. Can I help you with anything else?"
+
+    if catalog.items:
+        item_number = match_selection(message, catalog)
+        if item_number is not None:
+            result = await aselect_product_fn(session_id, item_number=item_number)
+            if result.success:
+                return f"{result.message}\n\nWould you like to confirm your order for {result.context['item_name']}? (yes/no)"
+            return "Sorry, I couldn’t select the product. Please check the number or try again."
+
+        refinement = match_refinement(message)
+        if refinement is not None:
+            items = refine_results(catalog, **refinement)
+            # Nothing left after filtering usually means the user wants a new search, leave that to the agent
+            if items:
+                return await asearch_results_text(items, catalog.query, catalog.domain, session_id, catalog.transaction_id)
+
+    return None
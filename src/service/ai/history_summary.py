@@ -0,0 +1,61 @@
+import logging
+import asyncio
+from typing import List
+
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from service.ai.chat_history import BoundedChatMessageHistory, get_chat_history
+from service.ai.llm_metrics import metrics_callback
+from service.ai.prompts_and_model import summary_model, summary_prompt_template
+
+logger = logging.getLogger(__name__)
+
+summary_chain = (summary_prompt_template | summary_model | StrOutputParser()).with_config(run_name="history_summary")
+
+
+class HistorySummarizer:
+    """Folds older turns of a session into its rolling summary in the background.
+
+    Scheduled after a turn has been answered, so the summary model never sits
+    on the request path; at most one summarization runs per session.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.runs = 0
+        self.failures = 0
+
+    def schedule(self, session_id: str) -> None:
+        if session_id in self._tasks:
+            return
+        history = get_chat_history(session_id)
+        messages, summarized_upto = history.pending_summary()
+        if not messages:
+            return
+        task = asyncio.get_running_loop().create_task(self._summarize(history, messages, summarized_upto))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+
+    async def _summarize(self, history: BoundedChatMessageHistory, messages: List[BaseMessage], summarized_upto: int) -> None:
+        try:
+            summary = await summary_chain.ainvoke(
+                {"summary": history.summary or "None yet.", "messages": messages},
+                config={"callbacks": [metrics_callback]},
+            )
+            await asyncio.to_thread(history.set_summary, summary.strip(), summarized_upto)
+            self.runs += 1
+        except Exception:
+            self.failures += 1
+            logger.exception("Error summarizing chat history", extra={"session_id": history.session_id})
+
+    def stop(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+
+    def stats(self) -> dict:
+        return {"running": len(self._tasks), "runs": self.runs, "failures": self.failures}
+
+
+history_summarizer = HistorySummarizer()
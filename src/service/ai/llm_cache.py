@@ -0,0 +1,119 @@
+import logging
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+# Eviction needs a COUNT(*), so only check the bound every few writes
+_EVICT_EVERY = 100
+
+
+class SQLiteLLMCache(BaseCache):
+    """Persistent LangChain LLM cache keyed on the rendered prompt and the model parameters.
+
+    Shared by every worker on the host through one SQLite file and bounded by
+    evicting the least recently used rows.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        try:
+            return loads(row[0])
+        except Exception as e:
+            logger.warning("Discarding unreadable LLM cache entry: %s", e)
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        value = dumps(return_val)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, last_used) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        """Purge every cached result"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        return {"path": self.path, "entries": count, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+# Opted into by the deterministic (temperature=0) classification model only
+classification_cache = SQLiteLLMCache() if LLM_CACHE_ENABLED else None
+
+
+if __name__ == "__main__":
+    # Admin entry point: `python -m service.ai.llm_cache [stats|purge]`
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = classification_cache or SQLiteLLMCache()
+    if command == "purge":
+        cache.clear()
+        print(f"Purged LLM cache at {cache.path}")
+    else:
+        print(cache.stats())
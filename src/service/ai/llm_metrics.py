@@ -0,0 +1,105 @@
+import time
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from utils.metrics import Counter, Histogram, registry
+
+# Chains timed as pipeline stages, by run name
+PIPELINE_STAGES = {"router", "chat_turn", "general_chain", "retail_agent", "history_summary"}
+
+stage_seconds = registry.histogram("chat_stage_duration_seconds", "Latency of chat pipeline stages", ["stage"])
+stage_errors = registry.counter("chat_stage_errors_total", "Chat pipeline stages that raised", ["stage"])
+llm_seconds = registry.histogram("llm_request_duration_seconds", "Latency of chat model calls per model instance", ["model"])
+llm_errors = registry.counter("llm_request_errors_total", "Chat model calls that raised", ["model"])
+llm_tokens = registry.counter("llm_tokens_total", "Prompt and completion tokens per model instance", ["model", "type"])
+llm_cached = registry.counter("llm_cached_responses_total", "Chat model calls answered from the LLM cache", ["model"])
+tool_seconds = registry.histogram("agent_tool_duration_seconds", "Latency of agent tool calls", ["tool"])
+tool_errors = registry.counter("agent_tool_errors_total", "Agent tool calls that raised", ["tool"])
+agent_actions = registry.counter("agent_actions_total", "Tool calls decided by the agent, one per agent iteration step", ["tool"])
+
+
+def _usage(response: LLMResult) -> Optional[dict]:
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage
+    token_usage = (response.llm_output or {}).get("token_usage")
+    if token_usage:
+        return {"input_tokens": token_usage.get("prompt_tokens", 0), "output_tokens": token_usage.get("completion_tokens", 0)}
+    return None
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records latency of pipeline stages, model calls and tools, and token usage per model instance.
+
+    Models are labelled with their instance name (the `name` given to
+    ChatOpenAI), tools with the tool name.
+    """
+
+    # Only updates in-memory counters, so it is safe to run on the event loop
+    run_inline = True
+
+    def __init__(self):
+        # run id -> (histogram, error counter, labels, start time)
+        self._runs: dict[UUID, tuple[Histogram, Counter, dict, float]] = {}
+
+    def _start(self, run_id: UUID, histogram: Histogram, errors: Counter, labels: dict) -> None:
+        self._runs[run_id] = (histogram, errors, labels, time.perf_counter())
+
+    def _end(self, run_id: UUID, failed: bool = False) -> Optional[dict]:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        histogram, errors, labels, started_at = run
+        histogram.observe(time.perf_counter() - started_at, **labels)
+        if failed:
+            errors.inc(**labels)
+        return labels
+
+    def on_chain_start(self, serialized: Optional[dict], inputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        if name in PIPELINE_STAGES:
+            self._start(run_id, stage_seconds, stage_errors, {"stage": name})
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, failed=True)
+
+    def on_chat_model_start(self, serialized: Optional[dict], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, llm_seconds, llm_errors, {"model": (serialized or {}).get("name", "unknown")})
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        labels = self._end(run_id)
+        if labels is None:
+            return
+        usage = _usage(response)
+        # Cache hits come back with total_cost zeroed; their tokens were not spent again
+        if usage and usage.get("total_cost") == 0:
+            llm_cached.inc(**labels)
+        elif usage:
+            llm_tokens.inc(usage.get("input_tokens", 0), type="prompt", **labels)
+            llm_tokens.inc(usage.get("output_tokens", 0), type="completion", **labels)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, failed=True)
+
+    def on_tool_start(self, serialized: Optional[dict], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, tool_seconds, tool_errors, {"tool": kwargs.get("name") or (serialized or {}).get("name", "unknown")})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, failed=True)
+
+    def on_agent_action(self, action: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        agent_actions.inc(tool=action.tool)
+
+
+metrics_callback = MetricsCallbackHandler()
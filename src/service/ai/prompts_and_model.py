@@ -1,7 +1,11 @@
+import os
+
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
+from service.ai.llm_cache import classification_cache
+
 
 global_system_instruction = """You are Luma an AI Agent that is capable to perform:
         - Beckn Open Network transactions for energy domains and their subdomains are
@@ -11,64 +15,47 @@ global_system_instruction = """You are Luma an AI Agent that is capable to perfo
         - If the user greets you then, greet the user, by introducing yourself introduce the user to your capabilities 
         """
 
-general_chat_model = ChatOpenAI(model="gpt-4o", temperature=0.6)
+# Instances are named so their latency and token metrics can be told apart
+general_chat_model = ChatOpenAI(model="gpt-4o", temperature=0.6, name="general_chat_model", stream_usage=True)
 
-categorier_model = ChatOpenAI(model="gpt-4o", temperature=0)
+# Tagged so the streaming endpoint can keep classifier labels out of the token stream.
+# Deterministic at temperature=0, so its results are cached on disk across restarts.
+categorier_model = ChatOpenAI(model="gpt-4o", temperature=0, tags=["classifier"], cache=classification_cache, name="categorier_model")
 
-retail_agent_model = ChatOpenAI(model="gpt-4o", temperature=0.3)
+retail_agent_model = ChatOpenAI(model="gpt-4o", temperature=0.3, name="retail_agent_model")
 
+# Cheaper model that folds older turns into each session's rolling summary, off the request path
+summary_model = ChatOpenAI(
+    model=os.getenv("CHAT_HISTORY_SUMMARY_MODEL", "gpt-4o-mini"),
+    temperature=0,
+    max_tokens=int(os.getenv("CHAT_HISTORY_SUMMARY_MAX_TOKENS", "300")),
+    tags=["summarizer"],
+    name="summary_model",
+)
 
-intent_categorier_prompt_template = ChatPromptTemplate.from_messages([
-    ("system", """You are Luma an AI Agent that is capable to perform Beckn Open Network transactions and answer general queries. categorier agent that is capable to categorize the user's message into a category.
-        """),
-    ("user", """
-    
-     User will send you a query and you will categorize the query into a category on below criteria and also you will be provided with the chat history analyse the conversation flow in the chat history and then categorize the query:
-     - If the query is about energy then it is a energy query
-     - If the user is asking or looking for some product or service or scheme or program or dfp(Demand Flexibility Program) then return "BECKN_TRANSACTION"
-     - If the user is asking to select a product or service or scheme or program or dfp(Demand Flexibility Program) then return "BECKN_TRANSACTION"
-     - If the user is asking to confirm an order or transaction then return "BECKN_TRANSACTION"
-     - If the user is asking to query related to any topic then return "GENERAL"
-     This is the chat_history: {chat_history} 
-     User's message: {input}
-     AI Response:
-     
-     
-     **NOTE:**
-     - Only return the category name, do not return any other text or explanation
-     - Decide the category based on the conversation flow in the chat history and the user's message
-     """),
-])
 
-domain_categoriser_prompt_template = ChatPromptTemplate.from_messages([
-    ("system", global_system_instruction),
+router_prompt_template = ChatPromptTemplate.from_messages([
+    ("system", """You are Luma an AI Agent that is capable to perform Beckn Open Network transactions and answer general queries. You are a router that decides the category and the domain of the user's message in a single step.
+        """),
     ("placeholder", "{chat_history}"),
     ("user", """
-     User will provide a message to you, and you will also be provided with the chat history with the user. Analyse the chat history and the user's message and categorize the user's message into a category on below criteria:    
-     - If the user is asking to search for a product then return "deg:retail"
-     - If the user is asking to search for a scheme (eg: demand flexibility program(DFP), demand side management program, discount on energy consumption, etc) then return "deg:schemes"
-     
-     - If the user is asking to select or pick or choose a product from the list that you can retrieve from the chat history then return "deg:retail"
-     - If the user is asking to select or pick or choose a scheme or program from the list that you can retrieve from the chat history then return "deg:schemes"
-     
-     
-     - If the user is asking to confirm an order or transaction for a product from the list that you can retrieve from the chat history then return then return "deg:retail"
-     - If the user is asking to confirm an order or transaction for a scheme or program or subscribe to a program from the list that you can retrieve from the chat history then return then return "deg:schemes"
-     
-     
-     **NOTE:**
-     - Only return the domain name, do not return any other text or explanation
-     
-     User's message: {input}
-     AI Response:
-     """),
-])
-
-
-
+     User will send you a query and you will also be provided with the chat history, analyse the conversation flow in the chat history and then decide the category and the domain of the query on below criteria:
 
+     category:
+     - If the user is asking or looking for some product or service or scheme or program or dfp(Demand Flexibility Program) then it is "BECKN_TRANSACTION"
+     - If the user is asking to select a product or service or scheme or program or dfp(Demand Flexibility Program) then it is "BECKN_TRANSACTION"
+     - If the user is asking to confirm an order or transaction then it is "BECKN_TRANSACTION"
+     - If the user is asking to query related to any topic then it is "GENERAL"
 
+     domain (only for "BECKN_TRANSACTION", otherwise null):
+     - If the user is asking to search, select or confirm a product (eg. Battery, Solar Panel, etc) then it is "deg:retail"
+     - If the user is asking to search, select, confirm or subscribe to a scheme or program (eg: demand flexibility program(DFP), demand side management program, discount on energy consumption, etc) then it is "deg:schemes"
+     - When the user refers to an item from an earlier list, use the domain of that list from the chat history
+     - If you are not sure, or the query spans both products and schemes (eg. a battery with a discount program), then it is null
 
+     User's message: {input}
+     """),
+])
 
 
 general_prompt_template = ChatPromptTemplate.from_messages([
@@ -87,6 +74,8 @@ retail_agent_prompt = ChatPromptTemplate.from_messages([
 
         ---
         Include the session_id: {session_id} and domain: {domain} in the tools as the input parameter
+        Current Beckn state of this conversation (search results, selection, order):
+        {catalog_summary}
         🛍️ **Workflow**
 
         1. **Search for Products**:
@@ -111,21 +100,19 @@ retail_agent_prompt = ChatPromptTemplate.from_messages([
         - If there's an API error:
             - Say: “Oops! Something went wrong while searching. Could you try again?”
 
+        1b. **Refine Results**:
+        - When the user wants to narrow or reorder the last results (eg. "only under ₹500", "highest rated first", "only 5kWh ones"), call `beckn_refine_results` with the matching filters instead of searching again.
+
         2. **Select Product**:
         - When the user selects a product:
-            - Look up the product in the `chat_history`.
-            - Extract `product_id`, `provider_id`, and `product_name` based on the user's selection number.
-            - If the input is invalid or not in the chat_history:
-                - Say: “Sorry, I couldn’t find the product. Please try again.”
-            - If valid:
-                - Call `beckn_select_api` with `product_id` and `provider_id`.
-                - If successful: confirm the selected product to the user using `product_name`.
-                - If failed: say “Sorry, I couldn’t select the product. Please check the number or try again.”
+            - Call `beckn_select_api` with the `item_number` of the product in the last search results list (or its `item_id` if the user did not pick by number). The server keeps the search results, so you never need product_id, provider_id, bpp_id or bpp_uri.
+            - If successful: confirm the selected product to the user using the product name from the tool response.
+            - If failed: say “Sorry, I couldn’t select the product. Please check the number or try again.”
 
         3. **Confirm Order**:
         - Ask: “Would you like to confirm your order for [Product Name]? (yes/no)”
         - If the user says “yes”:
-            - Call `beckn_confirm_api` with the `product_id`.
+            - Call `beckn_confirm_api`, it confirms the product selected in step 2.
             - If successful:
                 - Say: “✅ Order confirmed! Order ID: [order_id]. Your product will be delivered soon.”
             - If failed:
@@ -138,8 +125,9 @@ retail_agent_prompt = ChatPromptTemplate.from_messages([
 
         🛠️ **Tools Available**:
         - `beckn_search_api`: Search by product name.
-        - `select_product_api`: Select a product from the list.
+        - `beckn_select_api`: Select a product from the list by its number.
         - `beckn_confirm_api`: Confirm a selected product.
+        - `beckn_refine_results`: Filter or sort the last search results.
 
         Always guide users step-by-step, use polite language, and never expose raw technical data.
             """),
@@ -150,3 +138,15 @@ retail_agent_prompt = ChatPromptTemplate.from_messages([
         AI Response:
     """),
 ])
+
+
+summary_prompt_template = ChatPromptTemplate.from_messages([
+    ("system", """You maintain a running summary of a conversation between a user and Luma, an AI Agent for Beckn energy transactions and general queries.
+        Update the summary with the new messages below. Keep what later turns may refer to: what the user is looking for, their preferences and constraints,
+        products or schemes that were listed, selected or ordered (names, providers, prices, order ids) and open questions.
+        Drop greetings and small talk. Write at most a short paragraph of plain sentences, no lists or JSON.
+        """),
+    ("user", "Current summary:\n{summary}"),
+    ("placeholder", "{messages}"),
+    ("user", "Reply with the updated summary only."),
+])
@@ -0,0 +1,45 @@
+import hashlib
+import os
+import re
+import unicodedata
+from typing import Sequence
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage
+
+from utils.cache import TTLCache
+
+load_dotenv()
+
+GENERAL_CACHE_TTL_SECONDS = float(os.getenv("GENERAL_CACHE_TTL_SECONDS", "3600"))
+GENERAL_CACHE_MAX_ENTRIES = int(os.getenv("GENERAL_CACHE_MAX_ENTRIES", "1024"))
+# Only the most recent messages take part in the key so the key size stays bounded
+GENERAL_CACHE_HISTORY_MESSAGES = int(os.getenv("GENERAL_CACHE_HISTORY_MESSAGES", "4"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+general_response_cache = TTLCache(maxsize=GENERAL_CACHE_MAX_ENTRIES, ttl=GENERAL_CACHE_TTL_SECONDS)
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace so trivial variants share a key"""
+    message = unicodedata.normalize("NFKC", message).lower()
+    message = _PUNCTUATION.sub(" ", message)
+    return _WHITESPACE.sub(" ", message).strip()
+
+
+def history_fingerprint(chat_history: Sequence[BaseMessage]) -> str:
+    """Hash of the last GENERAL_CACHE_HISTORY_MESSAGES messages"""
+    recent = chat_history[-GENERAL_CACHE_HISTORY_MESSAGES:] if GENERAL_CACHE_HISTORY_MESSAGES > 0 else []
+    digest = hashlib.sha256()
+    for message in recent:
+        digest.update(message.type.encode())
+        digest.update(b"\x00")
+        digest.update(normalize_message(str(message.content)).encode())
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def general_cache_key(message: str, chat_history: Sequence[BaseMessage]) -> str:
+    return f"{normalize_message(message)}|{history_fingerprint(chat_history)}"
@@ -0,0 +1,79 @@
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from pymongo.asynchronous.collection import AsyncCollection
+
+from config.database import SESSION_CATALOG_COLLECTION, get_async_database, get_database
+from service.ai.chat_history import CHAT_HISTORY_BACKEND, CHAT_HISTORY_IDLE_TTL_SECONDS, CHAT_HISTORY_MAX_SESSIONS, CHAT_HISTORY_SESSION_TTL_SECONDS
+from service.schemas.catalog import SessionCatalog
+from utils.cache import TTLCache
+
+load_dotenv()
+
+# Age after which a cached session catalog is re-read so changes made by another worker are picked up
+SESSION_CATALOG_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CATALOG_CACHE_TTL_SECONDS", "5"))
+
+
+class SessionCatalogStore:
+    """Typed Beckn catalog state per chat session (search results, selection, order).
+
+    Held in a TTL cache; with the mongodb chat history backend it is also
+    written through to MongoDB so every worker resolves the same items.
+    Reads that act on the Beckn network (select, confirm) pass fresh=True
+    to skip the cache, since another worker may have changed the catalog.
+    Async callers use aget/asave so MongoDB I/O stays off the event loop.
+    """
+
+    def __init__(self, use_mongodb: bool = CHAT_HISTORY_BACKEND == "mongodb"):
+        ttl = SESSION_CATALOG_CACHE_TTL_SECONDS if use_mongodb else CHAT_HISTORY_IDLE_TTL_SECONDS
+        self._cache = TTLCache(maxsize=CHAT_HISTORY_MAX_SESSIONS, ttl=ttl)
+        self.collection = get_database()[SESSION_CATALOG_COLLECTION] if use_mongodb else None
+        if self.collection is not None:
+            self.collection.create_index("updated_at", expireAfterSeconds=CHAT_HISTORY_SESSION_TTL_SECONDS)
+
+    @property
+    def async_collection(self) -> AsyncCollection:
+        return get_async_database()[SESSION_CATALOG_COLLECTION]
+
+    def _cached(self, session_id: str, fresh: bool) -> Optional[SessionCatalog]:
+        if fresh and self.collection is not None:
+            return None
+        return self._cache.get(session_id)
+
+    def _loaded(self, session_id: str, doc: Optional[dict]) -> Optional[SessionCatalog]:
+        if not doc:
+            return None
+        catalog = SessionCatalog(**doc)
+        self._cache.set(session_id, catalog)
+        return catalog
+
+    @staticmethod
+    def _document(catalog: SessionCatalog) -> dict:
+        return {**catalog.model_dump(), "updated_at": datetime.now(timezone.utc)}
+
+    def get(self, session_id: str, fresh: bool = False) -> Optional[SessionCatalog]:
+        catalog = self._cached(session_id, fresh)
+        if catalog is None and self.collection is not None:
+            catalog = self._loaded(session_id, self.collection.find_one({"_id": session_id}, {"_id": 0}))
+        return catalog
+
+    async def aget(self, session_id: str, fresh: bool = False) -> Optional[SessionCatalog]:
+        catalog = self._cached(session_id, fresh)
+        if catalog is None and self.collection is not None:
+            catalog = self._loaded(session_id, await self.async_collection.find_one({"_id": session_id}, {"_id": 0}))
+        return catalog
+
+    def save(self, catalog: SessionCatalog) -> None:
+        self._cache.set(catalog.session_id, catalog)
+        if self.collection is not None:
+            self.collection.replace_one({"_id": catalog.session_id}, self._document(catalog), upsert=True)
+
+    async def asave(self, catalog: SessionCatalog) -> None:
+        self._cache.set(catalog.session_id, catalog)
+        if self.collection is not None:
+            await self.async_collection.replace_one({"_id": catalog.session_id}, self._document(catalog), upsert=True)
+
+
+session_catalog_store = SessionCatalogStore()
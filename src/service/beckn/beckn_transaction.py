@@ -1,24 +1,27 @@
-import requests
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-BECKN_BASE_URL = os.getenv("BECKN_BASE_URL")    
+from service.beckn.client import beckn_client
 
 
 def beckn_search(data):
-    response = requests.post(f"{BECKN_BASE_URL}/search", json=data)
-    return data
+    return beckn_client.post("search", data)
 
 def beckn_select(data):
-    response = requests.post(f"{BECKN_BASE_URL}/select", json=data)
-    return data
+    return beckn_client.post("select", data)
 
 def beckn_init(data):
-    response = requests.post(f"{BECKN_BASE_URL}/init", json=data)
-    return data
+    return beckn_client.post("init", data)
 
 def beckn_confirm(data):
-    response = requests.post(f"{BECKN_BASE_URL}/confirm", json=data)
-    return data
\ No newline at end of file
+    return beckn_client.post("confirm", data)
+
+
+async def abeckn_search(data):
+    return await beckn_client.apost("search", data)
+
+async def abeckn_select(data):
+    return await beckn_client.apost("select", data)
+
+async def abeckn_init(data):
+    return await beckn_client.apost("init", data)
+
+async def abeckn_confirm(data):
+    return await beckn_client.apost("confirm", data)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+from service.beckn.client import BecknClient
+
+load_dotenv()
+
+# "sync" waits on the BAP client's blocking API, "callback" sends the request
+# and aggregates the on_* callbacks that the network posts back to this service
+BECKN_MODE = os.getenv("BECKN_MODE", "sync")
+# Callback mode only, both required: the BAP client API that accepts actions, and the public
+# URL of this service's /api/beckn routes, sent as bap_uri so the on_* callbacks come back here
+BECKN_CALLBACK_BASE_URL = os.getenv("BECKN_CALLBACK_BASE_URL")
+BECKN_CALLBACK_BAP_URI = os.getenv("BECKN_CALLBACK_BAP_URI")
+# Worker processes uvicorn and gunicorn start when no --workers flag is given
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# How long to keep collecting callbacks for one request
+BECKN_CALLBACK_DEADLINES = {
+    "search": float(os.getenv("BECKN_CALLBACK_SEARCH_DEADLINE_SECONDS", "8")),
+    "select": float(os.getenv("BECKN_CALLBACK_SELECT_DEADLINE_SECONDS", "10")),
+    "init": float(os.getenv("BECKN_CALLBACK_INIT_DEADLINE_SECONDS", "10")),
+    "confirm": float(os.getenv("BECKN_CALLBACK_CONFIRM_DEADLINE_SECONDS", "15")),
+}
+BECKN_CALLBACK_DEFAULT_DEADLINE_SECONDS = 10.0
+
+CALLBACK_ACTIONS = {"on_search", "on_select", "on_init", "on_confirm", "on_status"}
+
+
+class CallbackRegistry:
+    """Correlates asynchronous on_* callbacks with the request that is waiting for them by message_id.
+
+    Waiters only exist in the process that sent the request, and the network
+    posts the callback to whichever worker takes the connection, so callback
+    mode runs with a single worker per BECKN_CALLBACK_BAP_URI; start_callbacks
+    refuses WEB_CONCURRENCY above 1.
+    """
+
+    def __init__(self):
+        self._pending: dict[str, asyncio.Queue] = {}
+        self.delivered = 0
+        self.unmatched = 0
+
+    def register(self, message_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._pending[message_id] = queue
+        return queue
+
+    def unregister(self, message_id: str) -> None:
+        self._pending.pop(message_id, None)
+
+    def deliver(self, payload: dict) -> bool:
+        """Hand a callback body to its waiting request; False when nobody is waiting for it"""
+        message_id = payload.get("context", {}).get("message_id")
+        queue = self._pending.get(message_id)
+        if queue is None:
+            self.unmatched += 1
+            return False
+        queue.put_nowait(payload)
+        self.delivered += 1
+        return True
+
+    async def stream(self, message_id: str, queue: asyncio.Queue, deadline: float) -> AsyncIterator[dict]:
+        """Yield callbacks for message_id as they arrive until the deadline passes"""
+        expires_at = time.monotonic() + deadline
+        while True:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+
+
+callback_registry = CallbackRegistry()
+beckn_callback_client = BecknClient(BECKN_CALLBACK_BASE_URL or "")
+
+# The app's event loop, which sync tools hand callback-mode requests to
+_app_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def start_callbacks() -> None:
+    """Check the Beckn mode configuration at startup and remember the app's event loop"""
+    global _app_loop
+    if BECKN_MODE not in ("sync", "callback"):
+        raise RuntimeError(f"BECKN_MODE must be sync or callback, not {BECKN_MODE!r}")
+    if BECKN_MODE == "callback":
+        missing = [name for name, value in (("BECKN_CALLBACK_BASE_URL", BECKN_CALLBACK_BASE_URL), ("BECKN_CALLBACK_BAP_URI", BECKN_CALLBACK_BAP_URI)) if not value]
+        if missing:
+            raise RuntimeError(f"BECKN_MODE=callback requires {', '.join(missing)}")
+        if WEB_CONCURRENCY > 1:
+            raise RuntimeError("BECKN_MODE=callback needs a single worker: on_* callbacks only reach the worker that sent the request")
+    _app_loop = asyncio.get_running_loop()
+
+
+def run_on_app_loop(coro, timeout: Optional[float] = None):
+    """Run a callback-mode coroutine from a sync caller; the callbacks are delivered on the app's loop"""
+    try:
+        current = asyncio.get_running_loop()
+    except RuntimeError:
+        current = None
+    if _app_loop is None or _app_loop.is_closed() or current is _app_loop:
+        coro.close()
+        raise RuntimeError("Beckn callback mode needs a sync caller running beside the app's event loop")
+    return asyncio.run_coroutine_threadsafe(coro, _app_loop).result(timeout)
+
+
+async def astream_action(action: str, payload: dict, deadline: Optional[float] = None) -> AsyncIterator[dict]:
+    """Send a Beckn action with our own ids and yield each on_<action> callback as it arrives"""
+    context = payload["context"]
+    context.setdefault("transaction_id", str(uuid.uuid4()))
+    context["message_id"] = str(uuid.uuid4())
+    context["bap_uri"] = BECKN_CALLBACK_BAP_URI
+    message_id = context["message_id"]
+    # Register before sending, callbacks can arrive before the ACK does
+    queue = callback_registry.register(message_id)
+    try:
+        await beckn_callback_client.apost(action, payload)
+        deadline = BECKN_CALLBACK_DEADLINES.get(action, BECKN_CALLBACK_DEFAULT_DEADLINE_SECONDS) if deadline is None else deadline
+        async for response in callback_registry.stream(message_id, queue, deadline):
+            yield response
+    finally:
+        callback_registry.unregister(message_id)
+
+
+async def arequest_first(action: str, payload: dict, deadline: Optional[float] = None) -> dict:
+    """Send a Beckn action and wait for its first callback, shaped like the sync BAP client's response"""
+    responses = []
+    stream = astream_action(action, payload, deadline)
+    try:
+        async for response in stream:
+            responses.append(response)
+            break
+    finally:
+        await stream.aclose()
+    return {"responses": responses}
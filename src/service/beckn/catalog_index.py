@@ -0,0 +1,257 @@
+import logging
+import asyncio
+import heapq
+import math
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from service.ai.response_cache import normalize_message
+from service.schemas.catalog import CatalogItem
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+CATALOG_INDEX_MAX_ITEMS = int(os.getenv("CATALOG_INDEX_MAX_ITEMS", "50000"))
+CATALOG_INDEX_TTL_SECONDS = float(os.getenv("CATALOG_INDEX_TTL_SECONDS", "1800"))
+# How many items of each /search response are indexed (the user still sees BECKN_SEARCH_TOP_K)
+CATALOG_INDEX_ITEMS_PER_SEARCH = int(os.getenv("CATALOG_INDEX_ITEMS_PER_SEARCH", "200"))
+# A new query is answered from the index without /search once it matches this many items, 0 disables it
+CATALOG_INDEX_MIN_RESULTS = int(os.getenv("CATALOG_INDEX_MIN_RESULTS", "5"))
+CATALOG_INDEX_REFRESH_INTERVAL_SECONDS = float(os.getenv("CATALOG_INDEX_REFRESH_INTERVAL_SECONDS", "600"))
+CATALOG_INDEX_REFRESH_QUERIES = int(os.getenv("CATALOG_INDEX_REFRESH_QUERIES", "20"))
+CATALOG_INDEX_MAX_RESULT_SETS = int(os.getenv("CATALOG_INDEX_MAX_RESULT_SETS", "4096"))
+
+SORT_OPTIONS = ("price_asc", "price_desc", "rating_desc")
+
+
+def _tokens(text: Optional[str]) -> set:
+    return set(normalize_message(text).split()) if text else set()
+
+
+def _number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class CatalogIndex:
+    """Local mirror of recently seen Beckn catalog items.
+
+    Items are kept with a token inverted index over their descriptors and
+    sorted price and rating columns, so keyword search, range filters and
+    sorting run in-process. The item list each query returned is remembered
+    so follow-ups can refine the last search without another /search.
+    """
+
+    def __init__(self, maxsize: int = CATALOG_INDEX_MAX_ITEMS, ttl: float = CATALOG_INDEX_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._ids: dict[tuple, int] = {}
+        # doc id -> (indexed_at, key, item), oldest first
+        self._docs: OrderedDict[int, tuple] = OrderedDict()
+        self._postings: dict[str, set] = {}
+        self._prices: list[tuple] = []
+        self._ratings: list[tuple] = []
+        # (domain, normalized query) -> keys of the items it returned, oldest first
+        self._results: OrderedDict[tuple, list] = OrderedDict()
+        # (domain, item_name) -> last time it was searched, most recent last
+        self._queries: OrderedDict[tuple, float] = OrderedDict()
+        self._refresher: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def _key(item: CatalogItem) -> tuple:
+        return (item.domain, item.bpp_id, item.provider_id, item.item_id)
+
+    def add(self, item_name: str, domain: str, items: Iterable[CatalogItem]) -> None:
+        """Index items returned for a query and remember them as that query's result set"""
+        now = time.monotonic()
+        with self._lock:
+            keys = []
+            for item in items:
+                key = self._key(item)
+                old_id = self._ids.get(key)
+                if old_id is not None:
+                    self._remove(old_id)
+                self._insert(key, item, now)
+                keys.append(key)
+            self._set_results(item_name, domain, keys)
+            while len(self._docs) > self.maxsize:
+                self._remove(next(iter(self._docs)))
+
+    def remember(self, item_name: str, domain: str, items: Iterable[CatalogItem]) -> None:
+        """Record items already in the index as a query's result set without refreshing them"""
+        with self._lock:
+            self._set_results(item_name, domain, [self._key(item) for item in items])
+
+    def _set_results(self, item_name: str, domain: str, keys: list) -> None:
+        query = (domain, normalize_message(item_name))
+        self._results[query] = keys
+        self._results.move_to_end(query)
+        while len(self._results) > CATALOG_INDEX_MAX_RESULT_SETS:
+            self._results.popitem(last=False)
+
+    def _insert(self, key: tuple, item: CatalogItem, now: float) -> None:
+        doc_id = self._next_id
+        self._next_id += 1
+        self._ids[key] = doc_id
+        self._docs[doc_id] = (now, key, item)
+        for token in _tokens(item.name) | _tokens(item.provider_name):
+            self._postings.setdefault(token, set()).add(doc_id)
+        price = _number(item.price)
+        if price is not None:
+            insort(self._prices, (price, doc_id))
+        rating = _number(item.rating)
+        if rating is not None:
+            insort(self._ratings, (rating, doc_id))
+
+    def _remove(self, doc_id: int) -> None:
+        _, key, item = self._docs.pop(doc_id)
+        del self._ids[key]
+        for token in _tokens(item.name) | _tokens(item.provider_name):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[token]
+        for column, value in ((self._prices, _number(item.price)), (self._ratings, _number(item.rating))):
+            if value is not None:
+                position = bisect_left(column, (value, doc_id))
+                if position < len(column) and column[position] == (value, doc_id):
+                    del column[position]
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._docs:
+            doc_id, (indexed_at, _, _) = next(iter(self._docs.items()))
+            if indexed_at >= cutoff:
+                break
+            self._remove(doc_id)
+
+    @staticmethod
+    def _range(column: list, low: Optional[float], high: Optional[float]) -> set:
+        start = bisect_left(column, (low, -1)) if low is not None else 0
+        end = bisect_right(column, (high, math.inf)) if high is not None else len(column)
+        return {doc_id for _, doc_id in column[start:end]}
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        domains: Optional[List[str]] = None,
+        within: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        sort_by: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[CatalogItem]:
+        """Items matching every query token, optionally restricted to what `within` returned in `domains`"""
+        with self._lock:
+            self._prune()
+            candidates: Optional[set] = None
+            if within is not None:
+                within_key = normalize_message(within)
+                candidates = {
+                    self._ids[key]
+                    for domain in domains or []
+                    for key in self._results.get((domain, within_key), [])
+                    if key in self._ids
+                }
+            # Intersect the rarest postings first so the working set shrinks quickly
+            for token in sorted(_tokens(query), key=lambda t: len(self._postings.get(t, ()))):
+                postings = self._postings.get(token, set())
+                candidates = set(postings) if candidates is None else candidates & postings
+                if not candidates:
+                    break
+            if min_price is not None or max_price is not None:
+                in_range = self._range(self._prices, min_price, max_price)
+                candidates = in_range if candidates is None else candidates & in_range
+            if min_rating is not None:
+                in_range = self._range(self._ratings, min_rating, None)
+                candidates = in_range if candidates is None else candidates & in_range
+            if candidates is None:
+                candidates = set(self._docs)
+            if domains and within is None:
+                candidates = {doc_id for doc_id in candidates if self._docs[doc_id][2].domain in domains}
+
+            if sort_by in SORT_OPTIONS:
+                # Rank the candidates by their own values rather than walking the whole column
+                field = "price" if sort_by.startswith("price") else "rating"
+                sign = 1 if sort_by == "price_asc" else -1
+                values = {doc_id: _number(getattr(self._docs[doc_id][2], field)) for doc_id in candidates}
+                ordered = heapq.nsmallest(limit, (doc_id for doc_id, value in values.items() if value is not None), key=lambda doc_id: (sign * values[doc_id], doc_id))
+                # Items without a value come last
+                if len(ordered) < limit:
+                    ordered += heapq.nsmallest(limit - len(ordered), (doc_id for doc_id, value in values.items() if value is None))
+            else:
+                ordered = heapq.nsmallest(limit, candidates)
+            return [self._docs[doc_id][2] for doc_id in ordered]
+
+    def answer(self, item_name: str, domain: str, sort_by: Optional[str], limit: int) -> Optional[List[CatalogItem]]:
+        """Serve a new search from the index when it already holds enough matching items"""
+        if CATALOG_INDEX_MIN_RESULTS <= 0:
+            return None
+        items = self.search(item_name, domains=[domain], sort_by=sort_by, limit=limit)
+        if len(items) < min(CATALOG_INDEX_MIN_RESULTS, limit):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return items
+
+    def record_query(self, item_name: str, domain: str) -> None:
+        with self._lock:
+            self._queries[(domain, item_name)] = time.monotonic()
+            self._queries.move_to_end((domain, item_name))
+            while len(self._queries) > CATALOG_INDEX_REFRESH_QUERIES:
+                self._queries.popitem(last=False)
+
+    def recent_queries(self) -> List[tuple]:
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            return [query for query, used_at in self._queries.items() if used_at >= cutoff]
+
+    def start(self, refresh: Callable[[str, str], Awaitable[None]]) -> None:
+        """Periodically re-run recent queries through `refresh` so the index stays warm"""
+        if self._refresher is None and CATALOG_INDEX_REFRESH_INTERVAL_SECONDS > 0:
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_loop(refresh))
+
+    def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+    async def _refresh_loop(self, refresh: Callable[[str, str], Awaitable[None]]) -> None:
+        while True:
+            await asyncio.sleep(CATALOG_INDEX_REFRESH_INTERVAL_SECONDS)
+            for domain, item_name in self.recent_queries():
+                try:
+                    await refresh(item_name, domain)
+                    self.refreshes += 1
+                except Exception:
+                    logger.exception("Catalog index refresh failed", extra={"domain": domain, "item_name": item_name})
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._docs),
+            "tokens": len(self._postings),
+            "queries": len(self._queries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
+
+
+catalog_index = CatalogIndex()
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from utils.metrics import registry
+
+load_dotenv()
+
+BECKN_BASE_URL = os.getenv("BECKN_BASE_URL", "https://bap-ps-client-deg.becknprotocol.io")
+
+# Per-action read timeouts; a hung BAP must not pin a worker for longer than these
+BECKN_TIMEOUTS = {
+    "search": float(os.getenv("BECKN_SEARCH_TIMEOUT_SECONDS", "30")),
+    "select": float(os.getenv("BECKN_SELECT_TIMEOUT_SECONDS", "20")),
+    "init": float(os.getenv("BECKN_INIT_TIMEOUT_SECONDS", "20")),
+    "confirm": float(os.getenv("BECKN_CONFIRM_TIMEOUT_SECONDS", "30")),
+}
+BECKN_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("BECKN_DEFAULT_TIMEOUT_SECONDS", "20"))
+BECKN_CONNECT_TIMEOUT_SECONDS = float(os.getenv("BECKN_CONNECT_TIMEOUT_SECONDS", "5"))
+BECKN_MAX_CONNECTIONS = int(os.getenv("BECKN_MAX_CONNECTIONS", "100"))
+BECKN_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("BECKN_MAX_KEEPALIVE_CONNECTIONS", "20"))
+BECKN_MAX_RETRIES = int(os.getenv("BECKN_MAX_RETRIES", "2"))
+BECKN_RETRY_BACKOFF_SECONDS = float(os.getenv("BECKN_RETRY_BACKOFF_SECONDS", "0.3"))
+
+# Only actions that do not change order state upstream are retried
+IDEMPOTENT_ACTIONS = {"search", "select", "init", "status", "track"}
+
+beckn_request_seconds = registry.histogram(
+    "beckn_request_duration_seconds",
+    "Latency of each Beckn BAP request attempt, by action and HTTP status (\"error\" when no response)",
+    ["action", "status"],
+)
+
+
+def _status(error: Optional[Exception], response: Optional[httpx.Response]) -> str:
+    if isinstance(error, httpx.HTTPStatusError):
+        return str(error.response.status_code)
+    if error is not None or response is None:
+        return "error"
+    return str(response.status_code)
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, httpx.TransportError)
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter so retries from many workers do not arrive in lockstep
+    return random.uniform(0, BECKN_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+class BecknClient:
+    """Shared keep-alive HTTP client for the Beckn BAP client API.
+
+    One connection pool per process for async callers and one for sync
+    callers, created lazily and reused across tool calls.
+    """
+
+    def __init__(self, base_url: str = BECKN_BASE_URL):
+        self.base_url = base_url.rstrip("/")
+        self._limits = httpx.Limits(
+            max_connections=BECKN_MAX_CONNECTIONS,
+            max_keepalive_connections=BECKN_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+
+    def _timeout(self, action: str) -> httpx.Timeout:
+        return httpx.Timeout(BECKN_TIMEOUTS.get(action, BECKN_DEFAULT_TIMEOUT_SECONDS), connect=BECKN_CONNECT_TIMEOUT_SECONDS)
+
+    def _retries(self, action: str) -> int:
+        return BECKN_MAX_RETRIES if action in IDEMPOTENT_ACTIONS else 0
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, limits=self._limits, headers={"Content-Type": "application/json"})
+        return self._async_client
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(base_url=self.base_url, limits=self._limits, headers={"Content-Type": "application/json"})
+        return self._sync_client
+
+    async def apost(self, action: str, payload: dict) -> dict:
+        """POST a Beckn action and return the decoded JSON body"""
+        retries = self._retries(action)
+        for attempt in range(retries + 1):
+            started_at, response = time.perf_counter(), None
+            try:
+                response = await self.async_client.post(f"/{action}", json=payload, timeout=self._timeout(action))
+                response.raise_for_status()
+                beckn_request_seconds.observe(time.perf_counter() - started_at, action=action, status=_status(None, response))
+                return response.json()
+            except httpx.HTTPError as e:
+                beckn_request_seconds.observe(time.perf_counter() - started_at, action=action, status=_status(e, response))
+                if attempt >= retries or not _retryable(e):
+                    raise
+                await asyncio.sleep(_backoff(attempt))
+
+    def post(self, action: str, payload: dict) -> dict:
+        """Blocking variant of apost for scripts and sync callers"""
+        retries = self._retries(action)
+        for attempt in range(retries + 1):
+            started_at, response = time.perf_counter(), None
+            try:
+                response = self.sync_client.post(f"/{action}", json=payload, timeout=self._timeout(action))
+                response.raise_for_status()
+                beckn_request_seconds.observe(time.perf_counter() - started_at, action=action, status=_status(None, response))
+                return response.json()
+            except httpx.HTTPError as e:
+                beckn_request_seconds.observe(time.perf_counter() - started_at, action=action, status=_status(e, response))
+                if attempt >= retries or not _retryable(e):
+                    raise
+                time.sleep(_backoff(attempt))
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+beckn_client = BecknClient()
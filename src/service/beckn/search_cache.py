@@ -0,0 +1,124 @@
+import logging
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+from service.ai.response_cache import normalize_message
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BECKN_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("BECKN_SEARCH_CACHE_TTL_SECONDS", "300"))
+# Extra time after the TTL during which a stale result is still served while it is refreshed
+BECKN_SEARCH_CACHE_STALE_SECONDS = float(os.getenv("BECKN_SEARCH_CACHE_STALE_SECONDS", "900"))
+BECKN_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("BECKN_SEARCH_CACHE_MAX_ENTRIES", "1024"))
+
+
+class SearchCache:
+    """Catalog cache for Beckn /search keyed on (domain, normalized item name, location).
+
+    Entries hold whatever the fetch returns; the search tool stores the parsed
+    top-K items rather than the raw response.
+
+    Fresh entries are served directly, stale ones are served while a single
+    background refresh runs, and concurrent misses for the same key share one
+    upstream call.
+    """
+
+    def __init__(
+        self,
+        ttl: float = BECKN_SEARCH_CACHE_TTL_SECONDS,
+        stale: float = BECKN_SEARCH_CACHE_STALE_SECONDS,
+        maxsize: int = BECKN_SEARCH_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl + stale)
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._refreshes: set[asyncio.Task] = set()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(domain: str, item_name: str, location: str) -> tuple:
+        return (domain, normalize_message(item_name), location)
+
+    def lookup(self, key: tuple) -> Optional[Any]:
+        """Fresh cached result for key, without refreshing; used by sync callers"""
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            self.fresh_hits += 1
+            return entry[1]
+        return None
+
+    def store(self, key: tuple, data: Any) -> None:
+        self._entries.set(key, (time.monotonic(), data))
+
+    async def get_or_fetch(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry:
+            fetched_at, data = entry
+            if time.monotonic() - fetched_at < self.ttl:
+                self.fresh_hits += 1
+                return data
+            self.stale_hits += 1
+            if key not in self._inflight:
+                task = asyncio.create_task(self._refresh(key, fetch))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+            return data
+        self.misses += 1
+        return await self._load(key, fetch)
+
+    async def _refresh(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await self._load(key, fetch)
+        except Exception:
+            logger.exception("Background search refresh failed", extra={"key": key})
+
+    async def _load(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        while (inflight := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # A cancelled leader (its client went away) is not our failure: fetch again, unless we are the one cancelled
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            self.store(key, data)
+            future.set_result(data)
+            return data
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+search_cache = SearchCache()
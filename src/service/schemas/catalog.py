@@ -0,0 +1,57 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class CatalogItem(BaseModel):
+    index: int
+    item_id: str
+    name: str
+    price: Optional[str] = None
+    currency: Optional[str] = None
+    rating: Optional[str] = None
+    provider_id: Optional[str] = None
+    provider_name: Optional[str] = None
+    bpp_id: Optional[str] = None
+    bpp_uri: Optional[str] = None
+    domain: Optional[str] = None
+    fulfillment_ids: List[str] = []
+
+
+class SelectedItem(BaseModel):
+    item: CatalogItem
+    fulfillment_id: Optional[str] = None
+    quote_value: Optional[str] = None
+    quote_currency: Optional[str] = None
+
+
+class SessionCatalog(BaseModel):
+    session_id: str
+    domain: Optional[str] = None
+    query: Optional[str] = None
+    # Beckn transaction of the search, carried into select and confirm so BPPs can correlate them
+    transaction_id: Optional[str] = None
+    items: List[CatalogItem] = []
+    selected: Optional[SelectedItem] = None
+    order_id: Optional[str] = None
+    # Set by the turn that selected an item and asked the user to confirm it, cleared by the next turn
+    awaiting_confirmation: bool = False
+
+    def by_index(self, index: int) -> Optional[CatalogItem]:
+        if 1 <= index <= len(self.items):
+            return self.items[index - 1]
+        return None
+
+    def by_item_id(self, item_id: str) -> Optional[CatalogItem]:
+        return next((item for item in self.items if item.item_id == item_id), None)
+
+    def summary(self) -> str:
+        """Compact, prompt-sized description of the session's Beckn state"""
+        lines = []
+        if self.items:
+            lines.append(f"Last search for '{self.query}' in {self.domain} returned {len(self.items)} items:")
+            lines.extend(f"{item.index}. {item.name} ({item.price} {item.currency}, {item.provider_name})" for item in self.items[:10])
+        if self.selected:
+            lines.append(f"Selected item: {self.selected.item.name} (item_id {self.selected.item.item_id})")
+        if self.order_id:
+            lines.append(f"Confirmed order id: {self.order_id}")
+        return "\n".join(lines)
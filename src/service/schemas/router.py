@@ -0,0 +1,22 @@
+from enum import Enum
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class Category(str, Enum):
+    BECKN_TRANSACTION = "BECKN_TRANSACTION"
+    GENERAL = "GENERAL"
+
+
+class Domain(str, Enum):
+    RETAIL = "deg:retail"
+    SCHEMES = "deg:schemes"
+
+
+# Domain string handed to the tools when the router cannot pick one; the search tool fans out over all of them
+ALL_DOMAINS = ",".join(domain.value for domain in Domain)
+
+
+class RouteDecision(BaseModel):
+    category: Category = Field(description="BECKN_TRANSACTION for searching, selecting or confirming products, services or schemes, otherwise GENERAL")
+    domain: Optional[Domain] = Field(default=None, description="The Beckn domain of a BECKN_TRANSACTION message, null for GENERAL messages or when the message is ambiguous or spans several domains")
@@ -1,9 +1,13 @@
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from dotenv import load_dotenv
+from utils.cache import TTLCache
 
 load_dotenv()
 
@@ -12,8 +16,25 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Decoded tokens, so repeated requests with the same bearer token skip jwt.decode
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+AUTH_TOKEN_CACHE_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+token_cache = TTLCache(maxsize=AUTH_TOKEN_CACHE_MAX_ENTRIES, ttl=AUTH_TOKEN_CACHE_TTL_SECONDS)
+
+# Password hashing context; hashes with a different cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt runs in its own threads so request handlers never hash on the event loop.
+# At most PASSWORD_HASH_WORKERS run at once; callers waiting longer than the queue timeout get PasswordHashingBusy.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", "2"))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+
+class PasswordHashingBusy(Exception):
+    """All password hashing slots stayed busy for longer than the queue timeout"""
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
@@ -23,6 +44,27 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def _run_hashing(func, *args):
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+    try:
+        await asyncio.wait_for(_hash_slots.acquire(), timeout=PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise PasswordHashingBusy()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_slots.release()
+
+async def aget_password_hash(password: str) -> str:
+    """Hash a password off the event loop"""
+    return await _run_hashing(pwd_context.hash, password)
+
+async def averify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password off the event loop; also returns a new hash when the stored one needs an update"""
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -36,12 +78,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[dict]:
-    """Verify and decode a JWT token"""
+    """Verify and decode a JWT token, served from token_cache until it expires"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        if payload.get("exp", float("inf")) > time.time():
+            return payload
+        token_cache.pop(token)
+        return None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+    # Never keep a token cached past its own expiry
+    ttl = min(AUTH_TOKEN_CACHE_TTL_SECONDS, payload.get("exp", float("inf")) - time.time())
+    if ttl > 0:
+        token_cache.set(token, payload, ttl=ttl)
+    return payload
 
 def extract_user_id_from_token(token: str) -> Optional[str]:
     """Extract user ID from JWT token"""
@@ -0,0 +1,13 @@
+import os
+
+from e2e_fakes import install_in_memory_mongodb
+
+# The app reads its configuration at import time; tests run without OpenAI, MongoDB or the on-disk LLM cache
+os.environ.setdefault("OPENAI_API_KEY", "test-not-used")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("CHAT_HISTORY_BACKEND", "memory")
+os.environ.setdefault("BECKN_MODE", "sync")
+os.environ.setdefault("DATABASE_NAME", "beckn_deg_bot_test")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+install_in_memory_mongodb()
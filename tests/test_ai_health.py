@@ -0,0 +1,46 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def auth_headers(client) -> dict:
+    meter_id = f"meter-{uuid.uuid4().hex[:12]}"
+    response = client.post("/api/auth/register", json={"meter_id": meter_id, "email": f"{meter_id}@example.com", "password": "test-password"})
+    return {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+
+def new_session(client, headers: dict) -> str:
+    return client.post("/api/ai/sessions", headers=headers).json()["data"]["session_id"]
+
+
+def test_health_requires_a_token(client):
+    assert client.post("/api/ai/health", json={"session_id": "anything"}).status_code in (401, 403)
+
+
+def test_health_returns_the_callers_own_session(client):
+    headers = auth_headers(client)
+    response = client.post("/api/ai/health", json={"session_id": new_session(client, headers)}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["data"] == []
+
+
+def test_health_hides_other_users_sessions(client):
+    session_id = new_session(client, auth_headers(client))
+    response = client.post("/api/ai/health", json={"session_id": session_id}, headers=auth_headers(client))
+    assert response.status_code == 404
+    assert "data" not in response.json()
+
+
+def test_health_without_a_session(client):
+    response = client.post("/api/ai/health", headers=auth_headers(client))
+    assert response.status_code == 200
+    assert response.json()["status"] == "healthy"
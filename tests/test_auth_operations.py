@@ -0,0 +1,70 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from models.user import user_service
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def operations(response) -> int:
+    return int(response.headers["X-DB-Operations"])
+
+
+def new_user() -> dict:
+    meter_id = f"meter-{uuid.uuid4().hex[:12]}"
+    return {"meter_id": meter_id, "email": f"{meter_id}@example.com", "password": "test-password"}
+
+
+def register(client, user: dict):
+    return client.post("/api/auth/register", json=user)
+
+
+def test_register_is_one_insert(client):
+    response = register(client, new_user())
+    assert response.status_code == 201
+    assert operations(response) == 1
+
+
+def test_duplicate_registration_is_rejected_by_the_insert(client):
+    user = new_user()
+    register(client, user)
+    response = register(client, {**new_user(), "meter_id": user["meter_id"]})
+    assert response.status_code == 400
+    assert operations(response) == 1
+    response = register(client, {**new_user(), "email": user["email"]})
+    assert response.status_code == 400
+
+
+def test_login_is_one_lookup(client):
+    user = new_user()
+    register(client, user)
+    response = client.post("/api/auth/login", json={"meter_id": user["meter_id"], "password": user["password"]})
+    assert response.status_code == 200
+    assert operations(response) == 1
+
+
+def test_wrong_password_is_one_lookup(client):
+    user = new_user()
+    register(client, user)
+    response = client.post("/api/auth/login", json={"meter_id": user["meter_id"], "password": "not-the-password"})
+    assert response.status_code == 401
+    assert operations(response) == 1
+
+
+def test_me_is_one_lookup_then_served_from_the_user_cache(client):
+    data = register(client, new_user()).json()["data"]
+    headers = {"Authorization": f"Bearer {data['access_token']}"}
+    user_service.invalidate_user(data["user"]["id"])
+    first = client.get("/api/auth/me", headers=headers)
+    assert first.status_code == 200
+    assert operations(first) == 1
+    second = client.get("/api/auth/me", headers=headers)
+    assert second.status_code == 200
+    assert operations(second) == 0
@@ -0,0 +1,45 @@
+import pytest
+
+from service.beckn.catalog_index import CatalogIndex
+from service.schemas.catalog import CatalogItem
+
+
+def item(item_id: str, name: str, price=None, rating=None) -> CatalogItem:
+    return CatalogItem(index=0, item_id=item_id, name=name, price=price, rating=rating, provider_id="provider", bpp_id="bpp", domain="deg:retail")
+
+
+@pytest.fixture
+def index():
+    index = CatalogIndex()
+    index.add("solar battery", "deg:retail", [
+        item("a", "Solar battery 5kWh", "900", "4.1"),
+        item("b", "Solar battery 10kWh", "1500", "4.8"),
+        item("c", "Solar battery compact", "400", None),
+        item("d", "Solar battery unpriced", None, "3.9"),
+    ])
+    # Indexed for another query, so it must not show up when refining the battery search
+    index.add("solar panel", "deg:retail", [item("e", "Solar panel", "100", "5.0")])
+    return index
+
+
+def ids(items):
+    return [item.item_id for item in items]
+
+
+@pytest.mark.parametrize("sort_by, expected", [
+    ("price_asc", ["c", "a", "b", "d"]),
+    ("price_desc", ["b", "a", "c", "d"]),
+    ("rating_desc", ["b", "a", "d", "c"]),
+])
+def test_sort_ranks_the_result_set_and_puts_missing_values_last(index, sort_by, expected):
+    assert ids(index.search(domains=["deg:retail"], within="solar battery", sort_by=sort_by)) == expected
+
+
+def test_sort_respects_the_limit(index):
+    assert ids(index.search(domains=["deg:retail"], within="solar battery", sort_by="price_asc", limit=2)) == ["c", "a"]
+
+
+def test_filters_and_keywords_narrow_the_result_set(index):
+    assert ids(index.search("10kwh", domains=["deg:retail"], within="solar battery")) == ["b"]
+    assert ids(index.search(domains=["deg:retail"], within="solar battery", max_price=1000, sort_by="price_desc")) == ["a", "c"]
+    assert ids(index.search(domains=["deg:retail"], within="solar battery", min_rating=4.5)) == ["b"]
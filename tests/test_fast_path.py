@@ -0,0 +1,145 @@
+import asyncio
+import uuid
+
+import pytest
+
+from service.ai import fast_path
+from service.ai.fast_path import match_confirmation, match_refinement, match_selection, run_fast_path
+from service.ai.session_catalog import session_catalog_store
+from service.schemas.catalog import CatalogItem, SelectedItem, SessionCatalog
+from service.schemas.product import ConfirmOrderResponse, SelectProductResponse
+
+
+def make_catalog(session_id: str = "session", items: int = 5) -> SessionCatalog:
+    return SessionCatalog(
+        session_id=session_id,
+        domain="deg:retail",
+        query="solar battery",
+        items=[CatalogItem(index=index, item_id=f"item-{index}", name=f"Battery {index}") for index in range(1, items + 1)],
+    )
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("2", 2),
+    ("3.", 3),
+    ("select 2", 2),
+    ("Pick the second one", 2),
+    ("choose item 4", 4),
+    ("number 1 please", 1),
+    ("I want to select the 3rd one", 3),
+    ("please pick option 5", 5),
+    ("the last one", 5),
+])
+def test_selection_matches_explicit_picks(message, expected):
+    assert match_selection(message, make_catalog()) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "buy 2", "get 3", "order 4 please", "want 1", "okay 2", "i want 2", "take 1",
+    "buy one", "two", "2 batteries", "select 2 and 3", "select 9",
+])
+def test_selection_leaves_quantities_and_unknown_items_to_the_agent(message):
+    assert match_selection(message, make_catalog()) is None
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("yes", True),
+    ("Yes, please!", True),
+    ("confirm the order", True),
+    ("no", False),
+    ("No thanks", False),
+    ("ok", None),
+    ("okay", None),
+    ("sure", None),
+    ("yes but a cheaper one", None),
+])
+def test_confirmation_takes_only_clear_answers(message, expected):
+    assert match_confirmation(message) is expected
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("only under 500", {"max_price": 500.0}),
+    ("show me the ones over rs 200", {"min_price": 200.0}),
+    ("over 4 stars", {"min_rating": 4.0}),
+    ("only rated 4 and above", {"min_rating": 4.0}),
+    ("cheapest first", {"sort_by": "price_asc"}),
+    ("only 5kwh ones under 500", {"max_price": 500.0, "keywords": "5kwh"}),
+])
+def test_refinement_parses_filters(message, expected):
+    assert match_refinement(message) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "what is the cheapest way to save energy",
+    "under 3 stars",
+    "tell me more about the second one",
+])
+def test_refinement_leaves_other_questions_to_the_agent(message):
+    assert match_refinement(message) is None
+
+
+@pytest.fixture
+def beckn_calls(monkeypatch):
+    """Replace the Beckn select and confirm calls of the fast path and record them"""
+    calls = []
+
+    async def select(session_id, item_number=None, item_id=None):
+        calls.append(("select", item_number))
+        catalog = await session_catalog_store.aget(session_id)
+        item = catalog.by_index(item_number)
+        catalog.selected = SelectedItem(item=item)
+        catalog.awaiting_confirmation = True
+        await session_catalog_store.asave(catalog)
+        return SelectProductResponse(success=True, message=f"Selected {item.name}.", context={"item_name": item.name})
+
+    async def confirm(session_id):
+        calls.append(("confirm", None))
+        return ConfirmOrderResponse(success=True, message="Order placed.", order_id="order-1")
+
+    monkeypatch.setattr(fast_path, "aselect_product_fn", select)
+    monkeypatch.setattr(fast_path, "aconfirm_order_fn", confirm)
+    return calls
+
+
+@pytest.fixture
+def session_id():
+    session_id = f"test-{uuid.uuid4().hex}"
+    session_catalog_store.save(make_catalog(session_id))
+    return session_id
+
+
+def turn(message: str, session_id: str):
+    return asyncio.run(run_fast_path(message, session_id))
+
+
+def test_yes_without_a_pending_select_is_left_to_the_agent(beckn_calls, session_id):
+    assert turn("yes", session_id) is None
+    assert beckn_calls == []
+
+
+def test_yes_right_after_a_select_confirms(beckn_calls, session_id):
+    assert "(yes/no)" in turn("select 2", session_id)
+    assert "Order placed." in turn("yes", session_id)
+    assert beckn_calls == [("select", 2), ("confirm", None)]
+
+
+def test_confirmation_is_only_taken_on_the_next_turn(beckn_calls, session_id):
+    turn("select 2", session_id)
+    assert turn("what is the warranty", session_id) is None
+    assert turn("yes", session_id) is None
+    assert beckn_calls == [("select", 2)]
+
+
+def test_no_drops_the_selection(beckn_calls, session_id):
+    turn("select 2", session_id)
+    assert "haven’t placed the order" in turn("no", session_id)
+    catalog = session_catalog_store.get(session_id)
+    assert catalog.selected is None and not catalog.awaiting_confirmation
+    assert beckn_calls == [("select", 2)]
+
+
+def test_unclear_answer_after_a_select_goes_to_the_agent(beckn_calls, session_id):
+    turn("select 2", session_id)
+    assert turn("ok", session_id) is None
+    assert not session_catalog_store.get(session_id).awaiting_confirmation
+    assert beckn_calls == [("select", 2)]
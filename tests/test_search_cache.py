@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from service.beckn.search_cache import SearchCache
+
+KEY = SearchCache.key("deg:retail", "solar battery", "NANP:628")
+
+
+class Upstream:
+    """Fetch function that counts its calls and answers after a short delay"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"result-{self.calls}"
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def scenario():
+        cache, upstream = SearchCache(), Upstream()
+        results = await asyncio.gather(*(cache.get_or_fetch(KEY, upstream) for _ in range(5)))
+        return cache, upstream, results
+
+    cache, upstream, results = asyncio.run(scenario())
+    assert upstream.calls == 1
+    assert results == ["result-1"] * 5
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_cancelled_leader_does_not_fail_the_waiters():
+    async def scenario():
+        cache, upstream = SearchCache(), Upstream()
+        leader = asyncio.create_task(cache.get_or_fetch(KEY, upstream))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_fetch(KEY, upstream)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return upstream, results
+
+    upstream, results = asyncio.run(scenario())
+    # One waiter takes over the fetch, the others join it
+    assert upstream.calls == 2
+    assert results == ["result-2"] * 3
+
+
+def test_cancelled_waiter_leaves_the_fetch_running():
+    async def scenario():
+        cache, upstream = SearchCache(), Upstream()
+        leader = asyncio.create_task(cache.get_or_fetch(KEY, upstream))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_fetch(KEY, upstream))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return upstream, await leader
+
+    upstream, result = asyncio.run(scenario())
+    assert (upstream.calls, result) == (1, "result-1")
+
+
+def test_failed_fetch_reaches_every_waiter():
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("BAP down")
+
+    async def scenario():
+        cache = SearchCache()
+        return await asyncio.gather(*(cache.get_or_fetch(KEY, failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario()))
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    async def scenario():
+        cache, upstream = SearchCache(ttl=0.05, stale=10), Upstream(delay=0.02)
+        first = await cache.get_or_fetch(KEY, upstream)
+        await asyncio.sleep(0.06)
+        stale = await asyncio.gather(*(cache.get_or_fetch(KEY, upstream) for _ in range(3)))
+        await asyncio.sleep(0.05)
+        refreshed = await cache.get_or_fetch(KEY, upstream)
+        return cache, upstream, first, stale, refreshed
+
+    cache, upstream, first, stale, refreshed = asyncio.run(scenario())
+    assert first == "result-1"
+    assert stale == ["result-1"] * 3
+    assert refreshed == "result-2"
+    assert upstream.calls == 2
+    assert cache.stats()["stale_hits"] == 3
+
+
+def test_entry_past_the_stale_window_is_fetched_again():
+    async def scenario():
+        cache, upstream = SearchCache(ttl=0.02, stale=0.02), Upstream(delay=0)
+        await cache.get_or_fetch(KEY, upstream)
+        await asyncio.sleep(0.05)
+        return await cache.get_or_fetch(KEY, upstream)
+
+    assert asyncio.run(scenario()) == "result-2"